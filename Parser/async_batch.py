@@ -0,0 +1,146 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import modify
+from modify import transform_source, file_rng, process_swift_file, MMAP_THRESHOLD
+from parser_pool import get_parser
+from output_tree import write_file_atomic, link_or_copy
+
+# =====================
+# asyncio 流水线：读取 / 转换 / 写回 三段并行
+# =====================
+# 读取和写回在 I/O 线程池里执行，转换在 CPU 执行器里执行（jobs > 1 时为进程池），
+# 三段之间用有界队列连接：网络盘上读写阻塞时 CPU 继续处理已读入的文件，
+# 解析时 I/O 线程继续预读和写回；队列满时上游自动等待，内存占用有上限。
+#
+# 不小于 MMAP_THRESHOLD 的大文件不经过队列，直接交给 process_swift_file
+# 用 mmap 读取并流式写出。
+
+_DONE = object()
+
+def _next_task(task_iter, lock):
+    # 任务迭代器（--output-dir 时边遍历边镜像目录、复制非 Swift 文件）在 I/O 线程里推进，
+    # 不阻塞事件循环；生成器不能被多个线程同时推进，用锁串行化
+    with lock:
+        return next(task_iter, _DONE)
+
+def _read_source(path):
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size >= MMAP_THRESHOLD:
+            return None
+        return f.read()
+
+def _write_output(path, data, source_path):
+    # 与 process_swift_file 相同：先写临时文件再 rename，输出路径是指向源文件的硬链接时不会改到源文件
+    write_file_atomic(path, lambda f: f.write(data), mode_from=source_path)
+
+def _transform(source_code, relpath, single_parse, seed):
+    rng, _ = file_rng(seed, relpath)
+    return transform_source(source_code, single_parse=single_parse, rng=rng)
+
+def _process_large(full_path, relpath, output_path, single_parse, seed):
+    process_swift_file(full_path, single_parse=single_parse, seed=seed, relpath=relpath, output_path=output_path)
+
+async def run_pipeline(tasks, jobs=1, read_ahead=16, write_behind=16, io_threads=8, single_parse=False, seed=None):
+    """
+    tasks: [(full_path, relpath, output_path)]，output_path 为 None 表示原地覆盖。
+    read_ahead / write_behind 为读取队列、写回队列的容量。
+    返回 (处理文件数, 出错文件列表 [(path, error), ...])。
+    """
+    loop = asyncio.get_running_loop()
+    read_queue = asyncio.Queue(maxsize=read_ahead)
+    write_queue = asyncio.Queue(maxsize=write_behind)
+    task_iter = iter(tasks)
+    task_lock = threading.Lock()
+    failures = []
+    processed = 0
+
+    io_pool = ThreadPoolExecutor(max_workers=io_threads)
+    if jobs > 1:
+        cpu_pool = ProcessPoolExecutor(max_workers=jobs, initializer=get_parser)
+    else:
+        # 单个 CPU 线程：解析仍然串行，但与 I/O 线程重叠
+        cpu_pool = ThreadPoolExecutor(max_workers=1)
+
+    async def reader():
+        # 多个 reader 共享同一个任务迭代器，同时最多 io_threads 个读请求在途
+        while True:
+            task = await loop.run_in_executor(io_pool, _next_task, task_iter, task_lock)
+            if task is _DONE:
+                return
+            try:
+                data = await loop.run_in_executor(io_pool, _read_source, task[0])
+            except Exception as e:
+                print(f"⚠️ 读取文件 {task[0]} 时出错: {e}")
+                failures.append((task[0], f"{type(e).__name__}: {e}"))
+                continue
+            await read_queue.put((task, data))
+
+    async def transformer():
+        nonlocal processed
+        while True:
+            item = await read_queue.get()
+            if item is _DONE:
+                return
+            (full_path, relpath, output_path), data = item
+            try:
+                if data is None:
+                    await loop.run_in_executor(cpu_pool, _process_large, full_path, relpath, output_path,
+                                               single_parse, seed)
+                    processed += 1
+                    continue
+                new_source = await loop.run_in_executor(cpu_pool, _transform, data, relpath, single_parse, seed)
+            except Exception as e:
+                print(f"⚠️ 处理文件 {full_path} 时出错: {e}")
+                failures.append((full_path, f"{type(e).__name__}: {e}"))
+                if output_path is not None:
+                    # 与 run_task 相同：出错的文件按原样放进输出目录，镜像树保持完整
+                    try:
+                        await loop.run_in_executor(io_pool, link_or_copy, full_path, output_path)
+                    except Exception as link_error:
+                        print(f"⚠️ 复制文件 {full_path} 到 {output_path} 时出错: {link_error}")
+                continue
+            await write_queue.put((output_path or full_path, new_source, full_path))
+
+    async def writer():
+        nonlocal processed
+        while True:
+            item = await write_queue.get()
+            if item is _DONE:
+                return
+            output_path, data, source_path = item
+            try:
+                await loop.run_in_executor(io_pool, _write_output, output_path, data, source_path)
+                processed += 1
+                if modify.VERBOSE: print(f"✅ 文件已保存：{output_path}")
+            except Exception as e:
+                print(f"⚠️ 写入文件 {output_path} 时出错: {e}")
+                failures.append((output_path, f"{type(e).__name__}: {e}"))
+
+    try:
+        transformers = [asyncio.ensure_future(transformer()) for _ in range(max(1, jobs))]
+        writers = [asyncio.ensure_future(writer()) for _ in range(io_threads)]
+
+        await asyncio.gather(*(reader() for _ in range(io_threads)))
+        for _ in transformers:
+            await read_queue.put(_DONE)
+        await asyncio.gather(*transformers)
+        for _ in writers:
+            await write_queue.put(_DONE)
+        await asyncio.gather(*writers)
+    finally:
+        cpu_pool.shutdown()
+        io_pool.shutdown()
+    return processed, failures
+
+def process_with_async_io(tasks, jobs=1, read_ahead=16, write_behind=16, io_threads=8, single_parse=False, seed=None):
+    processed, failures = asyncio.run(run_pipeline(
+        tasks, jobs=jobs, read_ahead=read_ahead, write_behind=write_behind, io_threads=io_threads,
+        single_parse=single_parse, seed=seed,
+    ))
+    print(f"✅ 共处理 {processed} 个文件，失败 {len(failures)} 个（异步 I/O，{jobs} 个 CPU worker）")
+    for path, error in failures:
+        print(f"   ❌ {path}: {error}")
+    return failures
@@ -1,26 +1,543 @@
 import os
 import sys
-from modify import process_swift_file  # 导入你写的处理单个文件函数
-
-def traverse_and_process(root_dir):
-    for dirpath, _, filenames in os.walk(root_dir):
-        for filename in filenames:
-            if filename.endswith(".swift"):
-                full_path = os.path.join(dirpath, filename)
-                print(f"Processing file: {full_path}")
+import argparse
+import json
+import threading
+from multiprocessing import Pool
+
+import modify
+from modify import process_swift_file, analyze_swift_file, CONFIG_HASH  # 导入你写的处理单个文件函数
+from method_generator import CATALOGUE_VERSION
+from parser_pool import get_parser, language_build_count
+from transform_cache import TransformCache, DEFAULT_MAX_BYTES
+from output_tree import iter_mirror_tree, link_or_copy
+from metrics import FileMetrics
+from plan_files import plan_path_for, apply_plans
+from async_batch import process_with_async_io
+from name_allocator import format_usage, ALLOCATOR_VERSION
+from symbol_table import build_and_report
+from git_source import GitError, changed_swift_files, git_path, head_commit
+from name_manifest import NameManifest
+from git_batch import process_git_revision, open_sink
+
+# =====================
+# 文件收集
+# =====================
+
+def collect_swift_files(root_dir):
+    """
+    用 os.scandir 深度优先遍历，发现一个 .swift 文件就产出一个，不必等整棵目录树列完。
+    栈里只保存待访问的目录，内存与文件总数无关。与 os.walk 一致，不进入指向目录的符号链接。
+    """
+    stack = [root_dir]
+    while stack:
+        directory = stack.pop()
+        try:
+            entries = os.scandir(directory)
+        except OSError:
+            continue
+        subdirs = []
+        with entries:
+            for entry in entries:
+                if entry.is_dir():
+                    if not entry.is_symlink():
+                        subdirs.append(entry.path)
+                elif entry.name.endswith(".swift"):
+                    yield entry.path
+        stack.extend(reversed(subdirs))
+
+def read_null_separated(stream, chunk_size=64 * 1024):
+    """
+    逐块读取以 NUL 分隔的路径列表（find -print0 / git ls-files -z 的输出），边读边产出。
+    """
+    pending = b""
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        parts = (pending + chunk).split(b"\0")
+        pending = parts.pop()
+        for part in parts:
+            if part:
+                yield os.fsdecode(part)
+    if pending:
+        yield os.fsdecode(pending)
+
+def relative_path(full_path, root_dir):
+    # 统一用 / 分隔，不同系统上派生出相同的随机数流
+    return os.path.relpath(full_path, root_dir).replace(os.sep, "/")
+
+def collect_listed_tasks(paths, root_dir, output_dir=None, plan_dir=None):
+    """
+    把外部给出的文件列表（相对当前目录或绝对路径）转成任务，只保留 root_dir 内的 .swift 文件。
+    output_dir 模式下只按需创建用到的输出目录，不镜像其他文件。
+    """
+    created_dir = None
+    for full_path in paths:
+        if not full_path.endswith(".swift"):
+            continue
+        relpath = relative_path(full_path, root_dir)
+        if relpath.startswith("../") or os.path.isabs(relpath):
+            print(f"⚠️ 跳过不在 {root_dir} 内的文件：{full_path}")
+            continue
+        if plan_dir:
+            output_path = plan_path_for(plan_dir, relpath)
+        elif output_dir:
+            output_path = os.path.join(output_dir, *relpath.split("/"))
+            out_dir = os.path.dirname(output_path)
+            if out_dir != created_dir:
+                os.makedirs(out_dir, exist_ok=True)
+                created_dir = out_dir
+        else:
+            output_path = None
+        yield full_path, relpath, output_path
+
+def collect_tasks(root_dir, output_dir=None, plan_dir=None, file_list=None):
+    """
+    返回 [(full_path, relpath, output_path)] 的生成器；output_path 为 None 表示原地覆盖。
+    边遍历边产出，调用方按需消费。
+    指定 output_dir 时边遍历边建镜像目录并链接非 Swift 文件。
+    指定 plan_dir（analyze 阶段）时 output_path 为对应的计划文件路径。
+    file_list 不为 None 时不遍历目录，只处理列表里的文件。
+    """
+    if file_list is not None:
+        return collect_listed_tasks(file_list, root_dir, output_dir, plan_dir)
+    if plan_dir:
+        return ((full_path, relpath, plan_path_for(plan_dir, relpath))
+                for full_path in collect_swift_files(root_dir)
+                for relpath in (relative_path(full_path, root_dir),))
+    if not output_dir:
+        return ((full_path, relative_path(full_path, root_dir), None)
+                for full_path in collect_swift_files(root_dir))
+    return _mirror_tasks(root_dir, output_dir)
+
+def _mirror_tasks(root_dir, output_dir):
+    counts = {"hardlink": 0, "reflink": 0, "copy": 0}
+    yield from iter_mirror_tree(root_dir, output_dir, counts)
+    print(f"📁 输出目录 {output_dir}：硬链接 {counts['hardlink']} 个，reflink {counts['reflink']} 个，复制 {counts['copy']} 个非 Swift 文件")
+
+def remove_outputs(relpaths, output_dir=None, plan_dir=None):
+    """
+    删除已不存在的源文件对应的输出文件或计划文件；原地模式下没有需要删除的内容。
+    """
+    removed = 0
+    for relpath in relpaths:
+        if plan_dir:
+            path = plan_path_for(plan_dir, relpath)
+        elif output_dir:
+            path = os.path.join(output_dir, *relpath.split("/"))
+        else:
+            return 0
+        try:
+            os.remove(path)
+            removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+def bounded(tasks, slots):
+    """
+    每产出一个任务先占一个名额，调用方每收到一个结果释放一个。
+    Pool.imap_unordered 会在后台线程里一口气读完整个可迭代对象，
+    用它包一层后遍历最多领先处理 slots 个文件，内存不随仓库大小增长。
+    """
+    for task in tasks:
+        slots.acquire()
+        yield task
+
+def open_cache(cache_dir, cache_max_bytes=DEFAULT_MAX_BYTES):
+    if not cache_dir:
+        return None
+    return TransformCache(cache_dir, CONFIG_HASH, f"{CATALOGUE_VERSION}:names{ALLOCATOR_VERSION}", max_bytes=cache_max_bytes)
+
+# =====================
+# 多进程 worker
+# =====================
+
+_worker_options = {}
+_worker_collect_metrics = False
+
+def _init_worker(options, cache_dir, cache_max_bytes, collect_metrics=False):
+    """
+    每个 worker 进程只执行一次：预热本进程共享的 parser（同时构造唯一的 Language），
+    并打开缓存目录。config.json 在 import modify 时已经加载，同样每个进程一次。
+    """
+    global _worker_options, _worker_collect_metrics
+    # worker 各自只知道自己写了多少，不负责淘汰，进程池结束后由主进程统一按上限清理
+    _worker_options = dict(options, cache=open_cache(cache_dir, None))
+    _worker_collect_metrics = collect_metrics
+    modify.VERBOSE = not options["quiet"]
+    get_parser()
+
+def _worker_stats():
+    cache = _worker_options.get("cache")
+    return {
+        "language_builds": language_build_count(),
+        "cache_hits": cache.hits if cache else 0,
+        "cache_misses": cache.misses if cache else 0,
+    }
+
+def run_task(task, options, metrics=None):
+    """
+    options: {"single_parse", "seed", "analyze", "quiet", "cache", "names", "symbols"}。
+    names 为项目共用的 NameAllocator（--unique-names project），否则为 None，每个文件各自分配。
+    symbols 为项目符号表（--symbols），只读，所有文件共用。
+    analyze 为 True 时只生成计划文件（task 的 output_path 即计划路径），否则直接处理文件；
+    处理出错且 output_path 不为 None 时，把源文件原样链接到 output_path 后再抛出异常。
+    返回该文件生成的名字列表（命中缓存且条目没有名字记录时为 None）。
+    """
+    full_path, relpath, output_path = task
+    if options["analyze"]:
+        return analyze_swift_file(full_path, output_path, seed=options["seed"], relpath=relpath, metrics=metrics,
+                                  names=options.get("names"), symbols=options.get("symbols"))
+    try:
+        return process_swift_file(full_path, single_parse=options["single_parse"], cache=options["cache"],
+                                  seed=options["seed"], relpath=relpath, output_path=output_path, metrics=metrics,
+                                  names=options.get("names"), symbols=options.get("symbols"))
+    except Exception:
+        if output_path is not None:
+            # 输出目录模式下出错的文件按原样放进输出目录，镜像树保持完整（与 --git-rev 一致）
+            link_or_copy(full_path, output_path)
+        raise
+
+def _process_in_worker(task):
+    # 异常在 worker 内部捕获并转成字符串，保证单个文件出错不影响整个进程池
+    # 同时带回本进程的累计统计（Language 构造次数、缓存命中数）、该文件的指标，
+    # 以及需要写名字清单时该文件生成的名字
+    full_path, relpath = task[0], task[1]
+    metrics = FileMetrics(full_path) if _worker_collect_metrics else None
+    error = None
+    issued = None
+    try:
+        issued = run_task(task, _worker_options, metrics)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    if not _worker_options["record_names"]:
+        issued = None
+    return full_path, relpath, error, os.getpid(), _worker_stats(), metrics_record(metrics, error), issued
+
+def metrics_record(metrics, error=None):
+    if metrics is None:
+        return None
+    record = metrics.to_dict()
+    if error is not None:
+        record["error"] = error
+    return record
+
+def write_metrics_line(metrics_file, record):
+    if metrics_file is not None and record is not None:
+        metrics_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+def report_language_builds(language_builds):
+    """
+    language_builds: {pid: 该进程构造 Language 的次数}，每个进程都应恰好为 1。
+    """
+    extra = {pid: n for pid, n in language_builds.items() if n > 1}
+    if extra:
+        print(f"⚠️ 以下进程重复构造了 Language: {extra}")
+    else:
+        print(f"🔧 Language 构造：{len(language_builds)} 个进程，每个进程 {max(language_builds.values(), default=0)} 次")
+
+def report_cache(hits, misses):
+    total = hits + misses
+    rate = hits / total * 100 if total else 0.0
+    print(f"♻️ 缓存命中 {hits} 次，未命中 {misses} 次（命中率 {rate:.1f}%）")
+
+# =====================
+# 遍历处理
+# =====================
+
+PROGRESS_EVERY = 1000  # quiet 模式下每处理这么多文件打印一次进度
+PENDING_CHUNKS_PER_JOB = 4  # 多进程时每个 worker 最多预先领取的 chunk 数
+
+def traverse_and_process(root_dir, jobs=1, chunksize=16, single_parse=False,
+                         cache_dir=None, cache_max_bytes=DEFAULT_MAX_BYTES, seed=None, output_dir=None,
+                         metrics_out=None, plan_dir=None, file_list=None, quiet=False, project_names=False,
+                         symbols=None, manifest=None):
+    """
+    jobs == 1 时保持原来的单进程顺序处理；
+    jobs > 1 时使用进程池，每个 worker 按 chunksize 批量领取文件。
+    目录边遍历边处理，多进程时最多领先 jobs * chunksize * PENDING_CHUNKS_PER_JOB 个文件。
+    single_parse 为 True 时每个文件只解析一次，按编辑计划一次性拼接。
+    cache_dir 不为空时启用转换结果缓存，结束时打印命中统计。
+    seed 不为 None 时每个文件使用由 (seed, 相对路径) 派生的独立随机数流，
+    输出与 jobs、处理顺序无关。
+    output_dir 不为空时不修改输入目录，结果写到镜像目录，其余文件以硬链接 / reflink 镜像。
+    metrics_out 不为空时把每个文件的阶段耗时和计数按 JSON lines 写入该文件。
+    plan_dir 不为空时为 analyze 阶段：只把编辑计划写到 plan_dir，不修改任何源文件。
+    file_list 不为 None 时只处理其中的文件（路径可迭代对象），不遍历目录。
+    quiet 为 True 时不再逐文件打印，只定期打印进度。
+    project_names 为 True 时所有文件共用一个名字分配器，生成的名字全项目唯一；
+    结果依赖处理顺序，只支持单进程且不使用缓存。
+    symbols 为预先构建的项目符号表（symbol_table.SymbolTable），多进程时随 initargs 交给 worker。
+    manifest 为 NameManifest 时记录每个处理过的文件生成的名字（由调用方保存）；
+    project_names 时清单里已有的名字都登记为已占用。
+    返回出错文件列表 [(path, error), ...]。
+    """
+    metrics_file = open(metrics_out, "w", encoding="utf-8") if metrics_out else None
+    try:
+        return _traverse_and_process(root_dir, jobs, chunksize, single_parse, cache_dir, cache_max_bytes,
+                                     seed, output_dir, metrics_file, plan_dir, file_list, quiet, project_names,
+                                     symbols, manifest)
+    finally:
+        if metrics_file is not None:
+            metrics_file.close()
+
+def _traverse_and_process(root_dir, jobs, chunksize, single_parse, cache_dir, cache_max_bytes,
+                          seed, output_dir, metrics_file, plan_dir, file_list, quiet, project_names, symbols,
+                          manifest):
+    failures = []
+    options = {"single_parse": single_parse, "seed": seed, "analyze": bool(plan_dir), "quiet": quiet,
+               "symbols": symbols, "record_names": manifest is not None}
+    if plan_dir:
+        cache_dir = None  # analyze 只生成计划，不使用结果缓存
+    tasks = collect_tasks(root_dir, output_dir, plan_dir, file_list)
+    processed = 0
+
+    if jobs <= 1:
+        cache = open_cache(cache_dir, cache_max_bytes)
+        options["cache"] = cache
+        options["names"] = modify.new_name_allocator() if project_names else None
+        if options["names"] is not None and manifest is not None:
+            options["names"].reserve(manifest.all_names())
+        verbose, modify.VERBOSE = modify.VERBOSE, not quiet
+        try:
+            for task in tasks:
+                full_path = task[0]
+                if not quiet:
+                    print(f"Processing file: {full_path}")
+                metrics = FileMetrics(full_path) if metrics_file is not None else None
+                error = None
                 try:
-                    process_swift_file(full_path)
+                    issued = run_task(task, options, metrics)
+                    if manifest is not None and issued is not None:
+                        manifest.record(task[1], issued)
                 except Exception as e:
                     print(f"⚠️ 处理文件 {full_path} 时出错: {e}")
+                    error = str(e)
+                    failures.append((full_path, error))
+                write_metrics_line(metrics_file, metrics_record(metrics, error))
+                processed += 1
+                if quiet and processed % PROGRESS_EVERY == 0:
+                    print(f"⏳ 已处理 {processed} 个文件")
+        finally:
+            modify.VERBOSE = verbose
+        if quiet:
+            print(f"✅ 共处理 {processed} 个文件，失败 {len(failures)} 个")
+        report_language_builds({os.getpid(): language_build_count()})
+        if cache is not None:
+            report_cache(cache.hits, cache.misses)
+        if options["names"] is not None:
+            print(format_usage(options["names"].usage()))
+        return failures
+
+    worker_stats = {}  # pid -> 该进程的累计统计，取最后一次上报的值
+    pending_limit = jobs * chunksize * PENDING_CHUNKS_PER_JOB
+    slots = threading.Semaphore(pending_limit)
+    with Pool(processes=jobs, initializer=_init_worker,
+              initargs=(options, cache_dir, cache_max_bytes, metrics_file is not None)) as pool:
+        results = pool.imap_unordered(_process_in_worker, bounded(tasks, slots), chunksize=chunksize)
+        try:
+            for full_path, relpath, error, pid, stats, record, issued in results:
+                slots.release()
+                processed += 1
+                worker_stats[pid] = stats
+                write_metrics_line(metrics_file, record)
+                if manifest is not None and issued is not None:
+                    manifest.record(relpath, issued)
+                if error is not None:
+                    print(f"⚠️ 处理文件 {full_path} 时出错: {error}")
+                    failures.append((full_path, error))
+                if quiet and processed % PROGRESS_EVERY == 0:
+                    print(f"⏳ 已处理 {processed} 个文件")
+        finally:
+            # 提前退出（异常 / Ctrl-C）时放开名额，避免进程池的任务线程卡在 acquire 上无法结束
+            for _ in range(pending_limit):
+                slots.release()
+
+    print(f"✅ 共处理 {processed} 个文件，失败 {len(failures)} 个（{jobs} 个进程）")
+    report_language_builds({pid: stats["language_builds"] for pid, stats in worker_stats.items()})
+    if cache_dir:
+        report_cache(sum(s["cache_hits"] for s in worker_stats.values()),
+                     sum(s["cache_misses"] for s in worker_stats.values()))
+        open_cache(cache_dir, cache_max_bytes).enforce_limit()
+    return failures
 
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print(f"Usage: python {sys.argv[0]} <root_directory>")
-        sys.exit(1)
+    arg_parser = argparse.ArgumentParser(description="批量处理目录下的所有 .swift 文件")
+    arg_parser.add_argument("root_directory", help="要处理的根目录")
+    arg_parser.add_argument("--jobs", "-j", type=int, default=1,
+                            help="并行 worker 进程数，0 表示使用全部 CPU 核心（默认 1，单进程）")
+    arg_parser.add_argument("--chunksize", type=int, default=16,
+                            help="每个 worker 一次领取的文件数（默认 16）")
+    arg_parser.add_argument("--single-parse", action="store_true",
+                            help="每个文件只解析一次，生成完整编辑计划后一次性拼接")
+    arg_parser.add_argument("--cache-dir",
+                            help="转换结果缓存目录，可在多台机器间拷贝共用（默认不启用缓存）")
+    arg_parser.add_argument("--cache-max-mb", type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024),
+                            help="缓存目录大小上限，超过后删除最久未使用的条目（默认 512）")
+    arg_parser.add_argument("--seed",
+                            help="全局随机种子；每个文件由 (seed, 相对路径) 派生独立随机数流，结果可复现")
+    arg_parser.add_argument("--output-dir",
+                            help="结果写到该镜像目录而不是原地覆盖；非 Swift 文件以硬链接 / reflink 镜像，必要时才复制")
+    arg_parser.add_argument("--metrics-out",
+                            help="把每个文件各阶段的耗时和计数（解析次数、匹配/跳过函数数、输入输出字节数）按 JSON lines 写入该文件")
+    mode_group = arg_parser.add_mutually_exclusive_group()
+    mode_group.add_argument("--analyze", metavar="PLAN_DIR",
+                            help="analyze 阶段：只解析并把每个文件的编辑计划写到 PLAN_DIR，不修改源文件")
+    mode_group.add_argument("--apply", metavar="PLAN_DIR",
+                            help="apply 阶段：校验输入 hash 后按 PLAN_DIR 中的计划拼接，不做任何解析")
+    arg_parser.add_argument("--async-io", action="store_true",
+                            help="读取 / 转换 / 写回三段流水线并行，适合网络盘等 I/O 延迟高的场景")
+    arg_parser.add_argument("--read-ahead", type=int, default=16,
+                            help="--async-io 时最多预读的文件数（默认 16）")
+    arg_parser.add_argument("--write-behind", type=int, default=16,
+                            help="--async-io 时最多等待写回的文件数（默认 16）")
+    arg_parser.add_argument("--io-threads", type=int, default=8,
+                            help="--async-io 时读写文件的线程数（默认 8）")
+    arg_parser.add_argument("--files0-from", metavar="FILE",
+                            help="从 FILE（- 表示标准输入）读取以 NUL 分隔的文件列表代替遍历目录，"
+                                 "例如 find ... -print0 | batch_modify.py root --files0-from -")
+    arg_parser.add_argument("--unique-names", choices=("file", "project"), default="file",
+                            help="生成的名字在单个文件内（默认）还是整个项目内唯一；project 只支持单进程且不能与缓存同时使用")
+    arg_parser.add_argument("--symbols", action="store_true",
+                            help="先扫描整个项目建立符号表：新名字避开项目已有标识符，"
+                                 "extension 可使用别的文件中 class 的 Bool 成员；需要 --seed")
+    arg_parser.add_argument("--since", metavar="GIT_REF",
+                            help="增量模式：只处理相对 GIT_REF 新增或修改的 .swift 文件（含未跟踪文件），"
+                                 "删除 / 重命名的文件同步删除其输出，并更新名字清单")
+    arg_parser.add_argument("--manifest", metavar="PATH",
+                            help="生成名字清单的路径；--since 时默认为 .git/swift-modify-names.json")
+    arg_parser.add_argument("--git-rev", metavar="REV",
+                            help="不读工作区，直接通过 git cat-file --batch 读取提交 REV 中的 .swift 文件；"
+                                 "结果写到 --output-dir 或 --tar")
+    arg_parser.add_argument("--tar", metavar="PATH",
+                            help="与 --git-rev 一起使用：结果写成 tar 流，- 表示标准输出")
+    arg_parser.add_argument("--quiet", "-q", action="store_true",
+                            help="不逐文件打印，只每 1000 个文件打印一次进度")
+    args = arg_parser.parse_args()
 
-    root_directory = sys.argv[1]
+    root_directory = args.root_directory
     if not os.path.isdir(root_directory):
         print(f"错误：{root_directory} 不是有效目录")
         sys.exit(1)
 
-    traverse_and_process(root_directory)
\ No newline at end of file
+    if args.output_dir:
+        output_real = os.path.realpath(args.output_dir)
+        root_real = os.path.realpath(root_directory)
+        if output_real == root_real or output_real.startswith(root_real + os.sep):
+            print(f"错误：输出目录 {args.output_dir} 不能位于 {root_directory} 内")
+            sys.exit(1)
+
+    if args.apply:
+        if args.since:
+            print("错误：--apply 按计划文件处理，不能与 --since 同时使用")
+            sys.exit(1)
+        if not os.path.isdir(args.apply):
+            print(f"错误：{args.apply} 不是有效目录")
+            sys.exit(1)
+        failures = apply_plans(args.apply, root_directory, args.output_dir)
+        sys.exit(1 if failures else 0)
+
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+    project_names = args.unique_names == "project"
+    if project_names and (jobs > 1 or args.cache_dir or args.async_io):
+        print("错误：--unique-names project 只支持单进程，且不能与 --cache-dir / --async-io 同时使用")
+        sys.exit(1)
+    if args.tar and not args.git_rev:
+        print("错误：--tar 需要与 --git-rev 一起使用")
+        sys.exit(1)
+    if args.git_rev:
+        if bool(args.output_dir) == bool(args.tar):
+            print("错误：--git-rev 需要 --output-dir 或 --tar 之一")
+            sys.exit(1)
+        if (args.since or args.files0_from or args.async_io or args.analyze or args.cache_dir or args.metrics_out
+                or args.symbols or args.manifest or project_names):
+            print("错误：--git-rev 不能与 --since / --files0-from / --async-io / --analyze / --cache-dir / "
+                  "--metrics-out / --symbols / --manifest / --unique-names project 同时使用")
+            sys.exit(1)
+        # tar 写到标准输出时，进度信息改到标准错误
+        stdout = sys.stdout.buffer
+        if args.tar == "-":
+            sys.stdout = sys.stderr
+        try:
+            sink = open_sink(root_directory, args.git_rev, args.output_dir, args.tar, stdout)
+            failures = process_git_revision(root_directory, args.git_rev, sink, jobs=jobs,
+                                            chunksize=max(1, args.chunksize), single_parse=args.single_parse,
+                                            seed=args.seed, quiet=args.quiet)
+        except GitError as e:
+            print(f"错误：{e}")
+            sys.exit(1)
+        sys.exit(1 if failures else 0)
+
+    symbols = None
+    if args.symbols:
+        # 符号表里每个 class 的 Bool 成员名随其所在文件变化，只处理部分文件时其余文件里的 extension
+        # 仍在使用旧名字，生成的工程无法编译，所以只支持全量处理
+        if args.seed is None or project_names or args.async_io or args.since or args.files0_from:
+            print("错误：--symbols 需要 --seed，且不能与 --unique-names project / --async-io / --since / "
+                  "--files0-from 同时使用")
+            sys.exit(1)
+        symbols = build_and_report([(full_path, relative_path(full_path, root_directory))
+                                    for full_path in collect_swift_files(root_directory)],
+                                   args.seed, jobs=jobs, chunksize=max(1, args.chunksize))
+    file_list = None
+    if args.files0_from:
+        stream = sys.stdin.buffer if args.files0_from == "-" else open(args.files0_from, "rb")
+        file_list = read_null_separated(stream)
+
+    manifest = None
+    commit = None
+    if args.since:
+        if args.files0_from or args.async_io:
+            print("错误：--since 不能与 --files0-from / --async-io 同时使用")
+            sys.exit(1)
+        try:
+            changes = changed_swift_files(root_directory, args.since)
+            commit = head_commit(root_directory)
+            manifest_path = args.manifest or git_path(root_directory, "swift-modify-names.json")
+        except GitError as e:
+            print(f"错误：{e}")
+            sys.exit(1)
+        print(f"🔀 相对 {args.since}：{len(changes.changed)} 个文件需要处理（其中重命名 {len(changes.renamed)} 个），"
+              f"{len(changes.removed) - len(changes.renamed)} 个已删除")
+        removed = remove_outputs(changes.removed, args.output_dir, args.analyze)
+        if removed:
+            print(f"🗑️ 删除了 {removed} 个过期的输出文件")
+        manifest = NameManifest.load(manifest_path)
+        renamed_from = set()
+        for old_path, new_path in changes.renamed:
+            manifest.rename(old_path, new_path)
+            renamed_from.add(old_path)
+        for relpath in changes.removed:
+            if relpath not in renamed_from:
+                manifest.remove(relpath)
+        if project_names:
+            # 这些文件会重新生成名字，旧名字不再占用；否则同一 seed 重抽到的旧名字也会被当成撞名
+            for relpath in changes.changed:
+                manifest.remove(relpath)
+        file_list = [os.path.join(root_directory, relpath) for relpath in changes.changed]
+    elif args.manifest:
+        manifest = NameManifest.load(args.manifest)
+        if file_list is None:
+            manifest.files.clear()  # 全量处理：清单整体重建，已删除文件的记录随之消失
+    if args.async_io:
+        if args.cache_dir or args.metrics_out or args.analyze or args.manifest:
+            print("错误：--async-io 暂不支持 --cache-dir / --metrics-out / --analyze / --manifest")
+            sys.exit(1)
+        modify.VERBOSE = not args.quiet
+        failures = process_with_async_io(collect_tasks(root_directory, args.output_dir, file_list=file_list), jobs=jobs,
+                                         read_ahead=max(1, args.read_ahead), write_behind=max(1, args.write_behind),
+                                         io_threads=max(1, args.io_threads), single_parse=args.single_parse,
+                                         seed=args.seed)
+        sys.exit(1 if failures else 0)
+
+    failures = traverse_and_process(root_directory, jobs=jobs, chunksize=max(1, args.chunksize),
+                                    single_parse=args.single_parse,
+                                    cache_dir=args.cache_dir, cache_max_bytes=args.cache_max_mb * 1024 * 1024,
+                                    seed=args.seed, output_dir=args.output_dir, metrics_out=args.metrics_out,
+                                    plan_dir=args.analyze, file_list=file_list, quiet=args.quiet,
+                                    project_names=project_names, symbols=symbols, manifest=manifest)
+    if manifest is not None:
+        manifest.save(commit)
+        print(f"📒 名字清单已更新：{manifest.path}（{len(manifest.files)} 个文件）")
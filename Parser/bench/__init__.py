@@ -0,0 +1 @@
+# 性能基准：合成 Swift 语料生成（corpus）与计时、基线对比（run）
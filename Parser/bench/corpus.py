@@ -0,0 +1,99 @@
+import argparse
+import os
+import random
+
+import method_generator
+
+# =====================
+# 合成 Swift 语料
+# =====================
+# 生成规模可调的 Swift 工程：文件数、每个文件的 class 数、每个 class 的方法数、
+# class 嵌套深度，以及 throws / 可选返回值 / static 方法所占比例。
+# 方法体直接复用 method_generator 的模板目录，同一个 seed 生成的语料完全相同。
+
+DEFAULT_SPEC = {
+    "files": 20,
+    "classes_per_file": 3,
+    "methods_per_class": 8,
+    "nesting_depth": 1,
+    "throws_ratio": 0.2,
+    "optional_ratio": 0.2,
+    "static_ratio": 0.1,
+    "seed": 0,
+}
+
+def indent_block(code, indent):
+    return "\n".join((indent + line) if line else line for line in code.split("\n"))
+
+def generate_method_code(rng, name, spec):
+    has_return = rng.random() < 0.6
+    templates = method_generator.compiled_with_return if has_return else method_generator.compiled_void
+    template = rng.choice(templates)
+    code = template["head"] + name + template["tail"]
+
+    signature, rest = code.split(" {\n", 1)
+    if has_return and rng.random() < spec["optional_ratio"]:
+        # 返回值改为可选类型，模板里的 return 语句仍然合法
+        head, return_type = signature.rsplit(" -> ", 1)
+        signature = f"{head} -> {return_type}?"
+    if rng.random() < spec["throws_ratio"]:
+        if " -> " in signature:
+            head, return_type = signature.rsplit(" -> ", 1)
+            signature = f"{head} throws -> {return_type}"
+        else:
+            signature += " throws"
+    if rng.random() < spec["static_ratio"]:
+        signature = "static " + signature
+    return f"{signature} {{\n{rest}"
+
+def generate_class(rng, name, spec, depth):
+    members = [f"var {name.lower()}Count: Int = 0"]
+    for index in range(spec["methods_per_class"]):
+        members.append(generate_method_code(rng, f"{name[0].lower()}{name[1:]}Method{index}", spec))
+    if depth > 0:
+        members.append(generate_class(rng, f"{name}Inner", spec, depth - 1))
+    body = "\n\n".join(indent_block(member, "    ") for member in members)
+    return f"class {name} {{\n{body}\n}}"
+
+def generate_file(rng, file_index, spec):
+    parts = ["import Foundation"]
+    for class_index in range(spec["classes_per_file"]):
+        name = f"Bench{file_index}Class{class_index}"
+        parts.append(generate_class(rng, name, spec, spec["nesting_depth"]))
+        # 每个 class 附带一个 extension，覆盖 extension 内的方法
+        extension_method = generate_method_code(rng, f"extensionMethod{class_index}", spec)
+        parts.append(f"extension {name} {{\n{indent_block(extension_method, '    ')}\n}}")
+    parts.append(generate_method_code(rng, f"freeFunction{file_index}", spec))
+    return "\n\n".join(parts) + "\n"
+
+def generate_corpus(output_dir, spec=None):
+    """
+    在 output_dir 下生成语料，返回生成的文件路径列表。
+    文件分散在若干子目录里，模拟真实工程的目录结构。
+    """
+    spec = dict(DEFAULT_SPEC, **(spec or {}))
+    rng = random.Random(spec["seed"])
+    paths = []
+    for file_index in range(spec["files"]):
+        directory = os.path.join(output_dir, f"Module{file_index % 4}")
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"BenchFile{file_index}.swift")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(generate_file(rng, file_index, spec))
+        paths.append(path)
+    return paths
+
+def add_spec_arguments(arg_parser):
+    for key, value in DEFAULT_SPEC.items():
+        arg_parser.add_argument("--" + key.replace("_", "-"), type=type(value), default=value, dest=key)
+
+def spec_from_args(args):
+    return {key: getattr(args, key) for key in DEFAULT_SPEC}
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="生成合成 Swift 语料")
+    arg_parser.add_argument("output_dir", help="语料输出目录")
+    add_spec_arguments(arg_parser)
+    args = arg_parser.parse_args()
+    paths = generate_corpus(args.output_dir, spec_from_args(args))
+    print(f"✅ 已生成 {len(paths)} 个文件到 {args.output_dir}")
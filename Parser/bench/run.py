@@ -0,0 +1,161 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+# modify 在 import 时从当前目录读取 config.json，基准总是在 Parser 目录下运行
+# 命令行里的相对路径按启动时的目录解析
+PARSER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAUNCH_DIR = os.getcwd()
+sys.path.insert(0, PARSER_DIR)
+os.chdir(PARSER_DIR)
+
+import modify
+from batch_modify import traverse_and_process
+from parser_pool import get_parser
+from metrics import FileMetrics
+from bench.corpus import generate_corpus, add_spec_arguments, spec_from_args
+
+# =====================
+# 计时
+# =====================
+
+def time_stages(source_code, parser, rng):
+    """
+    用 FileMetrics 记录分阶段流程（run_staged_pipeline）各阶段的耗时，返回 {stage: 秒}。
+    与 --metrics-out 使用同一套计时点，需要解析的阶段包含它自己的解析。
+    """
+    metrics = FileMetrics(None)
+    modify.transform_source(source_code, parser, rng=rng, metrics=metrics)
+    metrics.end()
+    return {stage: counters["seconds"] for stage, counters in metrics.stages.items()}
+
+def run_benchmarks(corpus_dir, paths, repeat=3, jobs_list=(1,), seed=0):
+    """
+    每项取 repeat 次中的最小值，返回 {name: 秒}。单文件项为全部文件耗时之和。
+    """
+    parser = get_parser()
+    sources = [(path, open(path, "rb").read()) for path in paths]
+    scratch = tempfile.mkdtemp(prefix="vonder-bench-out-")
+    results = {}
+
+    def record(name, seconds):
+        results[name] = min(results.get(name, float("inf")), seconds)
+
+    try:
+        # 预热一遍：编译查询、加载模板、填满各处的进程内缓存，不计入结果
+        for path, source_code in sources:
+            time_stages(source_code, parser, random.Random(seed))
+
+        for _ in range(repeat):
+            stage_totals = {}
+            for path, source_code in sources:
+                for stage, seconds in time_stages(source_code, parser, random.Random(seed)).items():
+                    stage_totals[stage] = stage_totals.get(stage, 0.0) + seconds
+            for stage, seconds in stage_totals.items():
+                record(f"stage.{stage}", seconds)
+
+            with contextlib.redirect_stdout(io.StringIO()):
+                for name, single_parse in (("process_swift_file.staged", False), ("process_swift_file.single_parse", True)):
+                    t = time.perf_counter()
+                    for index, (path, _) in enumerate(sources):
+                        output_path = os.path.join(scratch, f"{index}.swift")
+                        modify.process_swift_file(path, parser=parser, single_parse=single_parse,
+                                                  seed=seed, relpath=str(index), output_path=output_path)
+                    record(name, time.perf_counter() - t)
+
+                for jobs in jobs_list:
+                    output_dir = os.path.join(scratch, f"batch-{jobs}")
+                    shutil.rmtree(output_dir, ignore_errors=True)
+                    t = time.perf_counter()
+                    traverse_and_process(corpus_dir, jobs=jobs, seed=seed, output_dir=output_dir)
+                    record(f"batch_modify.jobs{jobs}", time.perf_counter() - t)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    return results
+
+# =====================
+# 基线对比
+# =====================
+
+def compare_with_baseline(current, baseline, threshold):
+    """
+    返回超过阈值的回退项 [(name, 基线秒数, 当前秒数, 比值)]，并打印对比表。
+    threshold = 0.1 表示比基线慢 10% 以上算回退。
+    """
+    regressions = []
+    print(f"{'benchmark':40} {'baseline':>10} {'current':>10} {'ratio':>8}")
+    for name in sorted(current):
+        if name not in baseline:
+            print(f"{name:40} {'-':>10} {current[name]:10.4f} {'new':>8}")
+            continue
+        ratio = current[name] / baseline[name] if baseline[name] > 0 else float("inf")
+        flag = ""
+        if ratio > 1 + threshold:
+            regressions.append((name, baseline[name], current[name], ratio))
+            flag = "  ⚠️"
+        print(f"{name:40} {baseline[name]:10.4f} {current[name]:10.4f} {ratio:8.2f}{flag}")
+    return regressions
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="生成合成语料并对 modify / batch_modify 计时")
+    arg_parser.add_argument("--out", default="bench_results.json", help="结果 JSON 文件（默认 bench_results.json）")
+    arg_parser.add_argument("--baseline", help="与之对比的基线结果 JSON")
+    arg_parser.add_argument("--threshold", type=float, default=0.10,
+                            help="回退阈值，比基线慢超过该比例时退出码为 1（默认 0.10）")
+    arg_parser.add_argument("--repeat", type=int, default=3, help="每项重复次数，取最小值（默认 3）")
+    arg_parser.add_argument("--jobs", default="1", help="batch_modify 端到端测试的进程数，逗号分隔（默认 1）")
+    arg_parser.add_argument("--corpus-dir", help="使用已有语料目录，不再生成")
+    add_spec_arguments(arg_parser)
+    args = arg_parser.parse_args()
+    for name in ("out", "baseline", "corpus_dir"):
+        if getattr(args, name):
+            setattr(args, name, os.path.join(LAUNCH_DIR, getattr(args, name)))
+
+    spec = spec_from_args(args)
+    corpus_dir = args.corpus_dir or tempfile.mkdtemp(prefix="vonder-bench-corpus-")
+    try:
+        if args.corpus_dir:
+            paths = sorted(os.path.join(d, f) for d, _, files in os.walk(corpus_dir) for f in files if f.endswith(".swift"))
+        else:
+            paths = generate_corpus(corpus_dir, spec)
+        input_bytes = sum(os.path.getsize(p) for p in paths)
+        jobs_list = [int(j) for j in args.jobs.split(",") if j]
+        timings = run_benchmarks(corpus_dir, paths, repeat=args.repeat, jobs_list=jobs_list, seed=spec["seed"])
+    finally:
+        if not args.corpus_dir:
+            shutil.rmtree(corpus_dir, ignore_errors=True)
+
+    results = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "files": len(paths),
+            "input_bytes": input_bytes,
+            "spec": None if args.corpus_dir else spec,
+            "repeat": args.repeat,
+        },
+        "timings": timings,
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"✅ 结果已写入 {args.out}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["timings"]
+        regressions = compare_with_baseline(timings, baseline, args.threshold)
+        if regressions:
+            print(f"❌ {len(regressions)} 项比基线慢超过 {args.threshold:.0%}")
+            sys.exit(1)
+        print("✅ 没有超过阈值的回退")
+    else:
+        for name in sorted(timings):
+            print(f"{name:40} {timings[name]:10.4f}")
@@ -0,0 +1,269 @@
+import argparse
+import asyncio
+import collections
+import io
+import os
+import signal
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import plan_files
+from modify import transform_source, build_edit_plan, parse_and_index, file_rng, plan_meta
+from parser_pool import get_parser
+from output_tree import write_file_atomic
+from daemon_client import LENGTH, encode_message, decode_header, default_socket_path, ensure_socket_dir, connect
+
+# =====================
+# 转换守护进程
+# =====================
+# 在 Unix socket 上常驻，解释器、tree-sitter、config.json 和模板目录只加载一次。
+# 每个连接可以连续发送请求，一个请求里带一批文件（路径或原始源码），返回转换结果或编辑计划，
+# 协议见 daemon_client.py。
+#
+# 结构与 async_batch 相同：连接处理协程把文件放进有界队列，worker 协程取出后交给 CPU 执行器
+# （jobs > 1 时为进程池），队列满时新请求自动等待。stats 请求返回吞吐量和队列深度。
+
+THROUGHPUT_WINDOW = 60.0  # 最近吞吐量的统计窗口（秒）
+
+def run_item(item, data, out, seed, single_parse):
+    """
+    在 CPU 执行器中处理一个文件。data 为 None 时读取 item["path"]。
+    返回 (结果 bytes，已按 output_path 写出时为 None, 输入字节数, 输出字节数)。
+    """
+    relpath = item.get("relpath") or item["path"]
+    if data is None:
+        with open(item["path"], "rb") as f:
+            data = f.read()
+    rng, file_seed = file_rng(seed, relpath)
+    if out == "plan":
+        # 与 analyze_swift_file 相同：单次解析生成计划
+        edits = build_edit_plan(parse_and_index(get_parser(), data), rng).edits()
+        buffer = io.BytesIO()
+        plan_files.dump_plan(buffer, relpath, data, edits, meta=plan_meta(file_seed))
+        result = buffer.getvalue()
+    else:
+        result = transform_source(data, single_parse=single_parse, rng=rng)
+
+    output_path = item.get("output_path")
+    if not output_path:
+        return result, len(data), len(result)
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    mode_from = item.get("path") if out != "plan" and "path" in item else None
+    write_file_atomic(output_path, lambda f: f.write(result), mode_from=mode_from)
+    return None, len(data), len(result)
+
+def check_items(items, payloads):
+    """
+    返回请求格式错误的说明，没有问题时返回 None。
+    """
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        return "items 必须是对象列表"
+    with_data = sum(bool(item.get("data")) for item in items)
+    if with_data != len(payloads):
+        return f"{with_data} 个条目带 data，但请求里有 {len(payloads)} 段负载"
+    for index, item in enumerate(items):
+        if item.get("data"):
+            if not (item.get("relpath") or item.get("path")):
+                return f"第 {index} 个条目带 data，但缺少 relpath"
+        elif not item.get("path"):
+            return f"第 {index} 个条目缺少 path"
+    return None
+
+class TransformDaemon:
+    def __init__(self, socket_path, jobs=1, queue_size=256):
+        self.socket_path = socket_path
+        self.jobs = max(1, jobs)
+        self.queue_size = queue_size
+        self.started = time.monotonic()
+        self.counters = {"requests": 0, "files": 0, "errors": 0, "bytes_in": 0, "bytes_out": 0}
+        self.in_flight = 0
+        self.connections = 0
+        self._handlers = {}  # 连接处理 task -> writer，退出时先关闭连接再结束
+        self._recent = collections.deque()  # 最近完成的 (时间, 输入字节数)
+
+    # ---------- 统计 ----------
+
+    def _record(self, bytes_in, bytes_out):
+        now = time.monotonic()
+        self.counters["files"] += 1
+        self.counters["bytes_in"] += bytes_in
+        self.counters["bytes_out"] += bytes_out
+        self._recent.append((now, bytes_in))
+        while self._recent and self._recent[0][0] < now - THROUGHPUT_WINDOW:
+            self._recent.popleft()
+
+    def stats(self):
+        now = time.monotonic()
+        uptime = now - self.started
+        while self._recent and self._recent[0][0] < now - THROUGHPUT_WINDOW:
+            self._recent.popleft()
+        window = min(uptime, THROUGHPUT_WINDOW) or 1.0
+        return dict(
+            self.counters,
+            uptime_seconds=round(uptime, 1),
+            files_per_second=round(self.counters["files"] / (uptime or 1.0), 2),
+            recent_files_per_second=round(len(self._recent) / window, 2),
+            recent_mb_per_second=round(sum(size for _, size in self._recent) / window / (1024 * 1024), 3),
+            queue_depth=self._queue.qsize(),
+            in_flight=self.in_flight,
+            queue_size=self.queue_size,
+            workers=self.jobs,
+            connections=self.connections,
+        )
+
+    # ---------- 处理 ----------
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            args, future = await self._queue.get()
+            self.in_flight += 1
+            try:
+                result = await loop.run_in_executor(self._executor, run_item, *args)
+            except Exception as e:
+                if not future.cancelled():
+                    future.set_exception(e)
+            else:
+                if not future.cancelled():
+                    future.set_result(result)
+            finally:
+                self.in_flight -= 1
+
+    async def _transform(self, header, payloads):
+        loop = asyncio.get_running_loop()
+        out = header.get("out", "bytes")
+        seed = header.get("seed")
+        single_parse = bool(header.get("single_parse"))
+        items = header.get("items", [])
+        # 入队之前整体检查：中途出错时已入队的文件没有人等待结果
+        error = check_items(items, payloads)
+        if error is not None:
+            return {"ok": False, "error": error}, []
+        data = iter(payloads)
+        futures = []
+        for item in items:
+            future = loop.create_future()
+            await self._queue.put(((item, next(data) if item.get("data") else None, out, seed, single_parse), future))
+            futures.append(future)
+
+        results = []
+        result_payloads = []
+        for item, future in zip(items, futures):
+            try:
+                result, bytes_in, bytes_out = await future
+            except Exception as e:
+                self.counters["errors"] += 1
+                results.append({"error": f"{type(e).__name__}: {e}"})
+                continue
+            self._record(bytes_in, bytes_out)
+            if result is None:
+                results.append({"written": item["output_path"]})
+            else:
+                results.append({"size": len(result)})
+                result_payloads.append(result)
+        return {"ok": True, "results": results}, result_payloads
+
+    async def _dispatch(self, header, payloads):
+        self.counters["requests"] += 1
+        op = header.get("op")
+        if op == "transform":
+            return await self._transform(header, payloads)
+        if op == "stats":
+            return {"ok": True, "stats": self.stats()}, []
+        if op == "shutdown":
+            self._stopped.set()
+            return {"ok": True}, []
+        return {"ok": False, "error": f"未知操作：{op}"}, []
+
+    async def _handle_connection(self, reader, writer):
+        self.connections += 1
+        self._handlers[asyncio.current_task()] = writer
+        try:
+            while True:
+                try:
+                    (length,) = LENGTH.unpack(await reader.readexactly(LENGTH.size))
+                except asyncio.IncompleteReadError:
+                    break  # 客户端关闭连接
+                header, sizes = decode_header(await reader.readexactly(length))
+                payloads = [await reader.readexactly(size) for size in sizes]
+                response, result_payloads = await self._dispatch(header, payloads)
+                writer.writelines(encode_message(response, result_payloads))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError) as e:
+            print(f"⚠️ 连接异常中断: {e}")
+        finally:
+            self.connections -= 1
+            self._handlers.pop(asyncio.current_task(), None)
+            writer.close()
+
+    async def serve(self):
+        loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._stopped = asyncio.Event()
+        if self.jobs > 1:
+            self._executor = ProcessPoolExecutor(max_workers=self.jobs, initializer=get_parser)
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=1, initializer=get_parser)
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, self._stopped.set)
+
+        workers = [asyncio.ensure_future(self._worker()) for _ in range(self.jobs)]
+        # bind 时 socket 文件按 umask 创建，先收紧 umask，不留其他用户可以连接的窗口；chmod 作为第二道保护
+        umask = os.umask(0o077)
+        try:
+            server = await asyncio.start_unix_server(self._handle_connection, path=self.socket_path)
+        finally:
+            os.umask(umask)
+        os.chmod(self.socket_path, 0o600)
+        print(f"🚀 守护进程已启动：{self.socket_path}（{self.jobs} 个 worker，队列容量 {self.queue_size}）")
+        try:
+            async with server:
+                await self._stopped.wait()
+        finally:
+            # 关闭仍然打开的连接，处理协程读到 EOF 后自行结束
+            handlers = list(self._handlers.items())
+            for _, writer in handlers:
+                writer.close()
+            await asyncio.gather(*(task for task, _ in handlers), return_exceptions=True)
+            for worker in workers:
+                worker.cancel()
+            self._executor.shutdown()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+        print(f"👋 守护进程已退出，共处理 {self.counters['files']} 个文件")
+
+# =====================
+# 脚本入口
+# =====================
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="常驻的 Swift 转换守护进程，通过 Unix socket 接收批量请求")
+    arg_parser.add_argument("--socket", help="Unix socket 路径（默认 $SWIFT_MODIFY_SOCKET，否则 $XDG_RUNTIME_DIR/swift-modify.sock，"
+                                                 "否则 /tmp/swift-modify-<uid>/daemon.sock）")
+    arg_parser.add_argument("--jobs", "-j", type=int, default=1,
+                            help="worker 数；大于 1 时使用进程池，0 表示使用全部 CPU 核心")
+    arg_parser.add_argument("--queue-size", type=int, default=256,
+                            help="等待处理的文件队列容量，满时新请求等待（默认 256）")
+    args = arg_parser.parse_args()
+
+    socket_path = args.socket or default_socket_path()
+    try:
+        ensure_socket_dir(socket_path)
+    except PermissionError as e:
+        print(f"错误：{e}")
+        sys.exit(1)
+    client = connect(socket_path)
+    if client is not None:
+        client.close()
+        print(f"错误：{socket_path} 上已有守护进程在运行")
+        sys.exit(1)
+    if os.path.lexists(socket_path):
+        try:
+            os.remove(socket_path)  # 上次异常退出留下的 socket 文件
+        except PermissionError:
+            print(f"错误：无法删除 {socket_path}（属于其他用户）")
+            sys.exit(1)
+
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+    asyncio.run(TransformDaemon(socket_path, jobs, max(1, args.queue_size)).serve())
@@ -0,0 +1,239 @@
+import argparse
+import json
+import os
+import socket
+import stat
+import struct
+import sys
+
+from plan_files import plan_path_for
+
+# =====================
+# 转换守护进程的协议和客户端
+# =====================
+# 本模块启动时不 import tree-sitter / modify，转发给守护进程时几乎没有启动开销；
+# 守护进程没有运行时才在本进程内 import modify 处理（与直接运行 modify.py 相同）。
+#
+# 消息格式：4 字节大端长度 + JSON 头 + 若干二进制负载，头里的 "sizes" 给出每段负载的长度。
+# 请求：
+#   {"op": "transform", "out": "bytes" | "plan", "seed": ..., "single_parse": bool,
+#    "items": [{"path": 源文件路径, "relpath": ..., "output_path": ...} 或 {"relpath": ..., "data": true}, ...]}
+#   "data": true 的条目按顺序对应一段负载（原始源码）；否则由守护进程读取 path。
+#   带 "output_path" 的条目由守护进程直接写出结果，不回传内容。
+#   {"op": "stats"} / {"op": "shutdown"}
+# 响应：
+#   {"ok": true, "results": [{"size": n} 或 {"written": 路径} 或 {"error": "..."}, ...]}，
+#   每个带 "size" 的结果按顺序对应一段负载（转换后的源码或计划文件内容）。
+#   请求格式错误（负载段数与 "data": true 的条目数不符、条目缺少 path 等）时整个请求不处理，
+#   返回 {"ok": false, "error": "..."}。
+
+LENGTH = struct.Struct(">I")
+
+def default_socket_path():
+    """
+    $SWIFT_MODIFY_SOCKET，否则 $XDG_RUNTIME_DIR/swift-modify.sock，否则 /tmp 下当前用户独占（0700）的目录里。
+    不直接放在 /tmp 下：路径可预测，其他用户可以抢先创建同名 socket 冒充守护进程。
+    """
+    path = os.environ.get("SWIFT_MODIFY_SOCKET")
+    if path:
+        return path
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return os.path.join(runtime_dir, "swift-modify.sock")
+    return os.path.join(f"/tmp/swift-modify-{os.getuid()}", "daemon.sock")
+
+def ensure_socket_dir(socket_path):
+    """
+    守护进程启动前调用：socket 所在目录不存在时以 0700 创建；已存在时必须属于当前用户、
+    不是符号链接，且（自动创建的目录）其他用户不可访问，否则抛出 PermissionError。
+    """
+    directory = os.path.dirname(os.path.abspath(socket_path))
+    created = False
+    try:
+        os.mkdir(directory, 0o700)
+        created = True
+    except FileExistsError:
+        pass
+    st = os.lstat(directory)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid():
+        raise PermissionError(f"{directory} 不是当前用户的目录")
+    if not created and directory == os.path.dirname(default_socket_path()) and st.st_mode & 0o077:
+        raise PermissionError(f"{directory} 的权限不是 0700")
+
+def check_socket_owner(socket_path):
+    """
+    连接前确认 socket 由当前用户创建，不连接其他用户放置的 socket。
+    """
+    st = os.stat(socket_path)
+    if not stat.S_ISSOCK(st.st_mode):
+        raise PermissionError(f"{socket_path} 不是 socket")
+    if st.st_uid != os.getuid():
+        raise PermissionError(f"{socket_path} 不属于当前用户")
+
+def encode_message(header, payloads=()):
+    """
+    返回待发送的片段列表，负载不拼接、不复制。
+    """
+    head = json.dumps(dict(header, sizes=[len(p) for p in payloads]), ensure_ascii=False).encode("utf-8")
+    return [LENGTH.pack(len(head)), head, *payloads]
+
+def decode_header(head):
+    header = json.loads(head.decode("utf-8"))
+    return header, header.pop("sizes", [])
+
+def _recv_exactly(sock, size):
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        n = sock.recv_into(view[received:])
+        if n == 0:
+            raise ConnectionError("连接已关闭")
+        received += n
+    return bytes(buffer)
+
+def send_message(sock, header, payloads=()):
+    for piece in encode_message(header, payloads):
+        sock.sendall(piece)
+
+def recv_message(sock):
+    (length,) = LENGTH.unpack(_recv_exactly(sock, LENGTH.size))
+    header, sizes = decode_header(_recv_exactly(sock, length))
+    return header, [_recv_exactly(sock, size) for size in sizes]
+
+class DaemonClient:
+    def __init__(self, socket_path=None, timeout=None):
+        self.socket_path = socket_path or default_socket_path()
+        check_socket_owner(self.socket_path)
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.settimeout(timeout)
+        try:
+            self._sock.connect(self.socket_path)
+        except OSError:
+            self._sock.close()
+            raise
+
+    def request(self, header, payloads=()):
+        send_message(self._sock, header, payloads)
+        response, payloads = recv_message(self._sock)
+        if not response.get("ok"):
+            raise RuntimeError(response.get("error", "守护进程返回错误"))
+        return response, payloads
+
+    def transform(self, items, payloads=(), out="bytes", seed=None, single_parse=False):
+        """
+        items / payloads 格式见模块说明。返回 [(result, data)]：data 为回传的内容，没有回传时为 None。
+        """
+        response, data = self.request({"op": "transform", "out": out, "seed": seed, "single_parse": single_parse,
+                                       "items": items}, payloads)
+        data = iter(data)
+        return [(result, next(data) if "size" in result else None) for result in response["results"]]
+
+    def stats(self):
+        return self.request({"op": "stats"})[0]["stats"]
+
+    def shutdown(self):
+        self.request({"op": "shutdown"})
+
+    def close(self):
+        self._sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def connect(socket_path=None):
+    """
+    守护进程在运行时返回 DaemonClient，否则返回 None。socket 不属于当前用户时同样返回 None（并给出提示）。
+    """
+    try:
+        return DaemonClient(socket_path)
+    except (FileNotFoundError, ConnectionRefusedError):
+        return None
+    except PermissionError as e:
+        print(f"⚠️ 不使用守护进程：{e}")
+        return None
+
+# =====================
+# 命令行：有守护进程时转发，否则在本进程内处理
+# =====================
+
+def output_path_for(path, root, output_dir=None, plan_dir=None):
+    relpath = os.path.relpath(path, root).replace(os.sep, "/")
+    if plan_dir:
+        return relpath, plan_path_for(plan_dir, relpath)
+    if output_dir:
+        return relpath, os.path.join(output_dir, *relpath.split("/"))
+    return relpath, path
+
+def run_in_process(tasks, out, seed, single_parse):
+    import modify
+    failures = []
+    for path, relpath, output_path in tasks:
+        try:
+            if out == "plan":
+                modify.analyze_swift_file(path, output_path, seed=seed, relpath=relpath)
+            else:
+                if output_path != path:
+                    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+                modify.process_swift_file(path, single_parse=single_parse, seed=seed, relpath=relpath,
+                                          output_path=None if output_path == path else output_path)
+        except Exception as e:
+            print(f"⚠️ 处理文件 {path} 时出错: {e}")
+            failures.append(path)
+    return failures
+
+def run_via_daemon(client, tasks, out, seed, single_parse, batch_size=256):
+    failures = []
+    for start in range(0, len(tasks), batch_size):
+        batch = tasks[start:start + batch_size]
+        items = [{"path": os.path.abspath(path), "relpath": relpath, "output_path": os.path.abspath(output_path)}
+                 for path, relpath, output_path in batch]
+        for (path, _, _), (result, _) in zip(batch, client.transform(items, out=out, seed=seed,
+                                                                     single_parse=single_parse)):
+            if "error" in result:
+                print(f"⚠️ 处理文件 {path} 时出错: {result['error']}")
+                failures.append(path)
+            else:
+                print(f"✅ 文件已保存：{result['written']}")
+    return failures
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="把 Swift 文件交给转换守护进程处理；守护进程未运行时在本进程内处理")
+    arg_parser.add_argument("files", nargs="*", help="要处理的 Swift 文件")
+    arg_parser.add_argument("--socket", help="守护进程的 Unix socket（默认 $SWIFT_MODIFY_SOCKET，否则 $XDG_RUNTIME_DIR/swift-modify.sock，"
+                                                  "否则 /tmp/swift-modify-<uid>/daemon.sock）")
+    arg_parser.add_argument("--root", default=".", help="计算相对路径（派生随机数流、输出路径）的根目录，默认当前目录")
+    arg_parser.add_argument("--seed", help="全局随机种子")
+    arg_parser.add_argument("--single-parse", action="store_true", help="每个文件只解析一次")
+    target_group = arg_parser.add_mutually_exclusive_group()
+    target_group.add_argument("--output-dir", help="结果写到该目录，不修改源文件")
+    target_group.add_argument("--plan-dir", help="只生成编辑计划，写到该目录")
+    arg_parser.add_argument("--stats", action="store_true", help="打印守护进程的吞吐量和队列深度")
+    arg_parser.add_argument("--stop", action="store_true", help="让守护进程处理完当前请求后退出")
+    arg_parser.add_argument("--no-daemon", action="store_true", help="不连接守护进程，直接在本进程内处理")
+    args = arg_parser.parse_args()
+
+    client = None if args.no_daemon else connect(args.socket)
+    if args.stats or args.stop:
+        if client is None:
+            print("守护进程未运行")
+            sys.exit(1)
+        with client:
+            if args.stats:
+                print(json.dumps(client.stats(), ensure_ascii=False, indent=1))
+            if args.stop:
+                client.shutdown()
+                print("👋 守护进程已停止")
+        sys.exit(0)
+
+    out = "plan" if args.plan_dir else "bytes"
+    tasks = [(path, *output_path_for(path, args.root, args.output_dir, args.plan_dir)) for path in args.files]
+    if client is None:
+        failures = run_in_process(tasks, out, args.seed, args.single_parse)
+    else:
+        with client:
+            failures = run_via_daemon(client, tasks, out, args.seed, args.single_parse)
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,152 @@
+import bisect
+
+# =====================
+# EditBuffer：原始 bytes 之上的 piece table
+# =====================
+# 所有编辑都用原始字节偏移表示 (start, end, text_bytes)，start == end 为纯插入。
+# 原始内容只读，不做任何拷贝；编辑按 (start, end, 加入顺序) 排序保存，
+# 生成结果时按顺序交替输出原始片段和插入片段，整个文件只拼接一次。
+#
+# 约定：
+# - 同一位置的多个插入按加入顺序排列，插入排在从该位置开始的替换之前；
+# - 替换之间不能部分重叠；落在某个替换区间内部的编辑会被丢弃
+#   （例如原函数体被改写后，函数体里局部 class 的 Bool 插入）。
+
+class EditBuffer:
+    def __init__(self, source):
+        self.source = source
+        self._keys = []          # [(start, end, edit_id)]，有序
+        self._texts = {}         # edit_id -> text_bytes
+        self._replacements = []  # [(start, end)]，只含非空替换，用于查找覆盖某个位置的替换
+        self._next_id = 0
+
+    def __len__(self):
+        return len(self._keys)
+
+    # ---------- 记录编辑 ----------
+
+    def replace(self, start, end, text):
+        """
+        把原始区间 [start, end) 替换为 text，返回编辑 id。
+        """
+        edit_id = self._next_id
+        self._next_id += 1
+        bisect.insort(self._keys, (start, end, edit_id))
+        self._texts[edit_id] = text
+        if end > start:
+            bisect.insort(self._replacements, (start, end))
+        return edit_id
+
+    def insert(self, pos, text):
+        return self.replace(pos, pos, text)
+
+    def text_of(self, edit_id):
+        return self._texts[edit_id]
+
+    def set_text(self, edit_id, text):
+        self._texts[edit_id] = text
+
+    # ---------- 读取 ----------
+
+    def _iter_active(self, lo=0, hi=None):
+        """
+        按顺序遍历 _keys[lo:hi] 中生效的编辑（跳过落在前一个替换区间内部的）。
+        """
+        last_end = -1
+        for start, end, edit_id in self._keys[lo:hi]:
+            if start < last_end:
+                continue
+            yield start, end, self._texts[edit_id]
+            last_end = max(last_end, end)
+
+    def edits(self):
+        """
+        返回生效的编辑列表 [(start, end, text_bytes)]，按原始偏移排序。
+        """
+        return list(self._iter_active())
+
+    def iter_pieces(self, start=0, end=None, include_end=False):
+        """
+        依次产出 [start, end) 这段原始内容应用编辑后的片段，不做拼接。
+        只包含完全落在区间内的编辑；include_end 为 True 时包含恰好插在 end 位置的内容。
+        """
+        if end is None:
+            end = len(self.source)
+        lo = bisect.bisect_left(self._keys, (start,))
+        hi = bisect.bisect_right(self._keys, (end, end, self._next_id)) if include_end else bisect.bisect_left(self._keys, (end,))
+        last_index = start
+        for s, e, text in self._iter_active(lo, hi):
+            if e > end or s < last_index:
+                continue
+            if s > last_index:
+                yield self.source[last_index:s]
+            if text:
+                yield text
+            last_index = e
+        if last_index < end:
+            yield self.source[last_index:end]
+
+    def slice(self, start, end, include_end=False):
+        return b"".join(self.iter_pieces(start, end, include_end))
+
+    def to_bytes(self):
+        """
+        生成最终结果；整个文件只拼接这一次。
+        """
+        return b"".join(self.iter_pieces())
+
+    def write_to(self, f):
+        """
+        把结果按片段直接写入文件对象，不在内存中生成完整结果。
+        """
+        for piece in self.iter_pieces():
+            f.write(piece)
+
+    def covering_replacement(self, pos):
+        """
+        返回严格覆盖 pos（start < pos < end）的替换区间，没有则返回 None。
+        """
+        index = bisect.bisect_left(self._replacements, (pos,)) - 1
+        if index >= 0:
+            start, end = self._replacements[index]
+            if start < pos < end:
+                return start, end
+        return None
+
+    def line_prefix(self, pos):
+        """
+        返回应用编辑后，原始偏移 pos 所在行从行首到 pos 的内容（用于计算缩进）。
+        """
+        line_start = self.source.rfind(b'\n', 0, pos) + 1
+        # 行首落在某个替换区间内时，向前扩展到该区间所在行的行首
+        covering = self.covering_replacement(line_start)
+        while covering is not None:
+            line_start = self.source.rfind(b'\n', 0, covering[0]) + 1
+            covering = self.covering_replacement(line_start)
+        text = self.slice(line_start, pos, include_end=True)
+        return text[text.rfind(b'\n') + 1:]
+
+    def map_offsets(self, positions, after_inserts=True):
+        """
+        把原始偏移 positions 映射到应用编辑后的偏移，返回与 positions 顺序一致的列表。
+        after_inserts 为 True 时，恰好插在某个位置的内容算在该位置之前；
+        位置落在某个替换区间内部时，映射到替换文本的起点。对 positions 排序后只扫描一遍编辑。
+        """
+        mapped = [0] * len(positions)
+        active = self._iter_active()
+        edit = next(active, None)
+        delta = 0
+        for index in sorted(range(len(positions)), key=positions.__getitem__):
+            pos = positions[index]
+            covered = False
+            while edit is not None:
+                start, end, text = edit
+                if start > pos or (start == pos and (end > start or not after_inserts)):
+                    break
+                if end > pos:
+                    covered = True
+                    break
+                delta += len(text) - (end - start)
+                edit = next(active, None)
+            mapped[index] = edit[0] + delta if covered else pos + delta
+        return mapped
@@ -0,0 +1,155 @@
+import io
+import os
+import tarfile
+import threading
+from multiprocessing import Pool
+
+from modify import transform_source, file_rng
+from parser_pool import get_parser
+from git_source import CatFileBatch, list_swift_blobs, commit_time
+from output_tree import write_file_atomic
+
+# =====================
+# 直接处理某个提交里的文件（不需要检出工作区）
+# =====================
+# list_swift_blobs 列出提交中的 .swift 文件，一个 git cat-file --batch 进程按顺序读出全部内容，
+# 转换后写到输出目录或 tar 流。多进程时用 Pool.imap 保持顺序，tar 内的文件顺序与 ls-tree 一致，
+# 同一提交、同一 seed 生成的 tar 逐字节相同（mtime 取提交时间）。
+# 转换出错的文件按原样输出，与原地处理出错时文件保持不变一致。
+
+PENDING_CHUNKS_PER_JOB = 4
+PROGRESS_EVERY = 1000
+
+class DirectorySink:
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self._created_dir = None
+
+    def write(self, relpath, mode, data):
+        path = os.path.join(self.output_dir, *relpath.split("/"))
+        directory = os.path.dirname(path)
+        if directory != self._created_dir:
+            os.makedirs(directory, exist_ok=True)
+            self._created_dir = directory
+        # 写临时文件、设好权限再 rename：输出目录里可能是之前 --output-dir 留下的指向工作区的硬链接，
+        # 直接截断会改到工作区文件；中途出错也不会留下半个文件
+        def write(f):
+            f.write(data)
+            os.fchmod(f.fileno(), mode)
+
+        write_file_atomic(path, write)
+        return path
+
+    def close(self):
+        pass
+
+class TarSink:
+    """
+    以流式 tar（"w|"）写出，不需要可 seek 的输出，可以直接写到管道。
+    """
+
+    def __init__(self, fileobj, mtime, close_file=False):
+        self._fileobj = fileobj
+        self._close_file = close_file
+        self._tar = tarfile.open(fileobj=fileobj, mode="w|", format=tarfile.PAX_FORMAT)
+        self.mtime = mtime
+
+    def write(self, relpath, mode, data):
+        info = tarfile.TarInfo(relpath)
+        info.size = len(data)
+        info.mode = mode
+        info.mtime = self.mtime
+        self._tar.addfile(info, io.BytesIO(data))
+        return relpath
+
+    def close(self):
+        self._tar.close()
+        if self._close_file:
+            self._fileobj.close()
+        else:
+            self._fileobj.flush()
+
+_worker_options = {}
+
+def _init_worker(options):
+    global _worker_options
+    _worker_options = options
+    get_parser()
+
+def _transform_blob(item):
+    """
+    item: (relpath, data)。返回 (输出 bytes, 错误信息或 None)。
+    """
+    relpath, data = item
+    rng, _ = file_rng(_worker_options["seed"], relpath)
+    try:
+        return transform_source(data, single_parse=_worker_options["single_parse"], rng=rng), None
+    except Exception as e:
+        return data, f"{type(e).__name__}: {e}"
+
+def process_git_revision(repo_dir, rev, sink, jobs=1, chunksize=16, single_parse=False, seed=None, quiet=False):
+    """
+    转换 repo_dir 中提交 rev 里的全部 .swift 文件，结果交给 sink（DirectorySink / TarSink）。
+    返回出错文件列表 [(relpath, error), ...]。
+    """
+    entries = list_swift_blobs(repo_dir, rev)
+    options = {"single_parse": single_parse, "seed": seed}
+    failures = []
+    processed = 0
+    bytes_in = 0
+
+    with CatFileBatch(repo_dir) as cat:
+        blobs = cat.read_blobs(entries)
+        if jobs <= 1:
+            _init_worker(options)
+            pool = None
+            results = ((entry, _transform_blob((entry.relpath, data))) for entry, data in blobs)
+        else:
+            # 与 batch_modify 相同：Pool.imap 会在后台线程一口气读完输入，用名额限制最多领先的文件数
+            pending_limit = jobs * chunksize * PENDING_CHUNKS_PER_JOB
+            slots = threading.Semaphore(pending_limit)
+
+            def bounded_items():
+                for entry, data in blobs:
+                    slots.acquire()
+                    yield entry.relpath, data
+
+            pool = Pool(processes=jobs, initializer=_init_worker, initargs=(options,))
+            results = zip(entries, pool.imap(_transform_blob, bounded_items(), chunksize=chunksize))
+
+        try:
+            for entry, (data, error) in results:
+                if pool is not None:
+                    slots.release()
+                processed += 1
+                bytes_in += entry.size
+                if error is not None:
+                    print(f"⚠️ 处理文件 {entry.relpath} 时出错，按原样输出: {error}")
+                    failures.append((entry.relpath, error))
+                written = sink.write(entry.relpath, entry.mode, data)
+                if not quiet:
+                    print(f"✅ 文件已保存：{written}")
+                elif processed % PROGRESS_EVERY == 0:
+                    print(f"⏳ 已处理 {processed} 个文件")
+        finally:
+            if pool is not None:
+                for _ in range(pending_limit):
+                    slots.release()
+                pool.terminate()
+                pool.join()
+            sink.close()
+
+    print(f"✅ 共处理 {processed} 个文件（{bytes_in / (1024 * 1024):.1f} MB，从 {rev} 的对象库读取），"
+          f"失败 {len(failures)} 个")
+    return failures
+
+def open_sink(repo_dir, rev, output_dir=None, tar_path=None, stdout=None):
+    """
+    tar_path 为 "-" 时写到 stdout（二进制流）。
+    """
+    if tar_path is None:
+        return DirectorySink(output_dir)
+    mtime = commit_time(repo_dir, rev)
+    if tar_path == "-":
+        return TarSink(stdout, mtime)
+    return TarSink(open(tar_path, "wb"), mtime, close_file=True)
@@ -0,0 +1,180 @@
+import os
+import subprocess
+import threading
+
+# =====================
+# 通过本地 git 命令行获取变更
+# =====================
+# 只调用本机的 git，不访问任何远程仓库，离线可用。
+# 所有输出都用 -z（NUL 分隔），文件名里有空格、引号或非 ASCII 字符时不需要反转义。
+
+class GitError(Exception):
+    pass
+
+def run_git(repo_dir, *args):
+    """
+    在 repo_dir 下执行 git，返回 stdout bytes；git 不存在或返回非 0 时抛出 GitError。
+    """
+    try:
+        result = subprocess.run(["git", "-C", repo_dir, *args], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except OSError as e:
+        raise GitError(f"无法执行 git: {e}")
+    if result.returncode != 0:
+        message = result.stderr.decode("utf-8", "replace").strip()
+        raise GitError(f"git {' '.join(args)} 失败: {message}")
+    return result.stdout
+
+def _split_z(output):
+    return [os.fsdecode(part) for part in output.split(b"\0") if part]
+
+def head_commit(repo_dir):
+    return run_git(repo_dir, "rev-parse", "HEAD").decode("ascii").strip()
+
+def git_path(repo_dir, name):
+    """
+    返回 .git 目录下 name 的路径（兼容 worktree / 子模块），用于存放不进入版本库的状态文件。
+    """
+    path = run_git(repo_dir, "rev-parse", "--git-path", name).decode("utf-8").strip()
+    return path if os.path.isabs(path) else os.path.join(repo_dir, path)
+
+class SwiftChanges:
+    """
+    changed: 需要（重新）处理的相对路径，包括新增、修改、重命名 / 复制后的新路径；
+    removed: 不再存在的相对路径，包括删除和重命名前的旧路径；
+    renamed: [(旧路径, 新路径)]。
+    路径都相对于传入的 root_dir，用 / 分隔。
+    """
+
+    def __init__(self):
+        self.changed = []
+        self.removed = []
+        self.renamed = []
+
+def _is_swift(path):
+    return path.endswith(".swift")
+
+def changed_swift_files(root_dir, ref):
+    """
+    比较 ref 与工作区（包括已暂存和未暂存的修改），再加上未被忽略的未跟踪文件。
+    只看 root_dir 以内的文件。重命名的一端不是 .swift 时按新增或删除处理。
+    """
+    changes = SwiftChanges()
+    # --relative：只列出 root_dir 内的变更，路径相对于 root_dir
+    output = run_git(root_dir, "diff", "--name-status", "-z", "-M", "--relative", "--no-ext-diff", ref, "--")
+    fields = iter(_split_z(output))
+    for status in fields:
+        kind = status[0]
+        if kind in "RC":
+            old_path, new_path = next(fields), next(fields)
+            if kind == "R" and _is_swift(old_path):
+                changes.removed.append(old_path)
+                if _is_swift(new_path):
+                    changes.renamed.append((old_path, new_path))
+            if _is_swift(new_path):
+                changes.changed.append(new_path)
+            continue
+        path = next(fields)
+        if not _is_swift(path):
+            continue
+        if kind == "D":
+            changes.removed.append(path)
+        elif kind in "AMT":
+            changes.changed.append(path)
+        # U（未解决的冲突）、X 等跳过，交给使用者处理
+
+    untracked = run_git(root_dir, "ls-files", "--others", "--exclude-standard", "-z")
+    changes.changed.extend(path for path in _split_z(untracked) if _is_swift(path))
+    return changes
+
+# =====================
+# 直接从对象库读取文件内容
+# =====================
+# ls-tree 列出某个提交里的 .swift blob，再用一个常驻的 git cat-file --batch 进程按顺序读出全部内容：
+# 一条管道顺序读取，代替逐个文件的 open / stat / close，也不需要检出工作区。
+
+class BlobEntry:
+    __slots__ = ("relpath", "oid", "mode", "size")
+
+    def __init__(self, relpath, oid, mode, size=None):
+        self.relpath = relpath
+        self.oid = oid
+        self.mode = mode
+        self.size = size
+
+def commit_time(repo_dir, rev):
+    return int(run_git(repo_dir, "show", "-s", "--format=%ct", rev).decode("ascii").strip())
+
+def list_swift_blobs(repo_dir, rev):
+    """
+    返回 rev 中 repo_dir 以内全部 .swift 普通文件的 [BlobEntry]，顺序与 ls-tree 相同。
+    符号链接（120000）和子模块（160000）跳过。
+    """
+    # 在子目录下执行时 ls-tree 只列出该子目录，路径相对于该子目录
+    output = run_git(repo_dir, "ls-tree", "-r", "-z", rev)
+    entries = []
+    for record in output.split(b"\0"):
+        if not record:
+            continue
+        meta, path = record.split(b"\t", 1)
+        mode, kind, oid = meta.split(b" ")
+        relpath = os.fsdecode(path)
+        if kind != b"blob" or mode not in (b"100644", b"100755") or not relpath.endswith(".swift"):
+            continue
+        entries.append(BlobEntry(relpath, oid.decode("ascii"), int(mode, 8) & 0o777))
+    return entries
+
+class CatFileBatch:
+    """
+    常驻的 git cat-file --batch 进程。请求由后台线程连续写入，read_blobs 按同样的顺序读出结果，
+    两端同时进行，管道不会因为一端写满而卡住。
+    """
+
+    def __init__(self, repo_dir):
+        try:
+            self._process = subprocess.Popen(["git", "-C", repo_dir, "cat-file", "--batch"],
+                                             stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        except OSError as e:
+            raise GitError(f"无法执行 git: {e}")
+
+    def read_blobs(self, entries):
+        """
+        按 entries 的顺序产出 (entry, data)；entry.size 同时被填上。
+        """
+        entries = list(entries)
+        stdout = self._process.stdout
+
+        def feed():
+            try:
+                for entry in entries:
+                    self._process.stdin.write(entry.oid.encode("ascii") + b"\n")
+                self._process.stdin.flush()
+            except (BrokenPipeError, ValueError):
+                pass  # 读取方提前结束并关闭了管道
+
+        writer = threading.Thread(target=feed, daemon=True)
+        writer.start()
+        for entry in entries:
+            header = stdout.readline()
+            parts = header.split()
+            if len(parts) != 3 or parts[1] != b"blob":
+                raise GitError(f"cat-file 返回了意外的结果：{header!r}（{entry.relpath}）")
+            entry.size = int(parts[2])
+            data = stdout.read(entry.size)
+            stdout.read(1)  # 内容之后的换行
+            yield entry, data
+        writer.join()
+
+    def close(self):
+        # 先关读端：提前结束时 git 写输出会收到 EPIPE 退出，写请求的线程随之结束
+        self._process.stdout.close()
+        try:
+            self._process.stdin.close()
+        except BrokenPipeError:
+            pass
+        self._process.wait()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,3 +1,5 @@
+import hashlib
+import json
 import random
 
 verbs = [
@@ -469,17 +471,41 @@ templates_void = [
   }
 ]
 
-def generate_method(has_return: bool = True) -> str:
-    templates = templates_with_return if has_return else templates_void
-    template = random.choice(templates)
-    
-    verb = random.choice(verbs)
-    noun = random.choice(nouns)
-    method_name = "degention" + verb + noun[0].upper() + noun[1:]
-    
-    signature = template["signature"].replace("{name}", method_name)
-    body_lines = template["body"]
-    body = "\n".join("    " + line for line in body_lines)
-    
-    func_code = f"{signature} {{\n{body}\n}}"
-    return func_code
\ No newline at end of file
+# =====================
+# 预编译模板目录
+# =====================
+# import 时把每个模板渲染一次：以方法名为界切成前后两段，
+# 函数体已经缩进并拼接好，返回/无返回类型也已确定。生成方法时只需拼接三段。
+
+NAME_SLOT = "{name}"
+
+def _compile_template(template):
+    body = "\n".join("    " + line for line in template["body"])
+    head, tail = template["signature"].split(NAME_SLOT, 1)
+    return {"head": head, "tail": f"{tail} {{\n{body}\n}}"}
+
+compiled_with_return = [_compile_template(t) for t in templates_with_return]
+compiled_void = [_compile_template(t) for t in templates_void]
+
+# 模板和词表内容的指纹，内容变化时生成结果随之变化（用于缓存失效）
+CATALOGUE_VERSION = hashlib.sha256(json.dumps(
+    [verbs, nouns, templates_with_return, templates_void], sort_keys=True
+).encode("utf-8")).hexdigest()[:16]
+
+def draw_method_name(rng=random):
+    verb = rng.choice(verbs)
+    noun = rng.choice(nouns)
+    return "degention" + verb + noun[0].upper() + noun[1:]
+
+def generate_method(has_return: bool = True, rng=random, names=None):
+    """
+    返回 (代码, 方法名)。
+    rng 为随机数来源（random.Random 实例），默认使用全局 random 模块。
+    names 为 NameAllocator 时方法名由它分配，保证不与已生成的名字重复。
+    """
+    templates = compiled_with_return if has_return else compiled_void
+    template = rng.choice(templates)
+
+    method_name = names.method_name() if names is not None else draw_method_name(rng)
+
+    return template["head"] + method_name + template["tail"], method_name
@@ -0,0 +1,52 @@
+import time
+
+# =====================
+# 单文件处理指标
+# =====================
+# 调用方持有 metrics=None 时所有埋点都是 `if metrics:` 一次判断，不产生任何开销。
+# 启用时按阶段记录耗时和计数，阶段名与流程一致：
+#   insert_bools / generate_copies / insert_copies / rewrite_originals / insert_ifs，
+# 另外有 read / parse / write 等辅助阶段。计数归属到当前阶段。
+
+class FileMetrics:
+    def __init__(self, path):
+        self.path = path
+        self.stages = {}      # stage -> {"seconds": float, 计数名: int}
+        self.values = {}      # 文件级信息：bytes_in / bytes_out / cache / mode 等
+        self._stage = None
+        self._started = 0.0
+        self._created = time.perf_counter()
+
+    def begin(self, stage):
+        """
+        开始一个阶段，自动结束上一个阶段。同名阶段多次出现时累加。
+        """
+        now = time.perf_counter()
+        self._close(now)
+        self._stage = stage
+        self._started = now
+        self.stages.setdefault(stage, {"seconds": 0.0})
+
+    def end(self):
+        self._close(time.perf_counter())
+        self._stage = None
+
+    def _close(self, now):
+        if self._stage is not None:
+            self.stages[self._stage]["seconds"] += now - self._started
+
+    def add(self, name, n=1):
+        stage = self.stages.setdefault(self._stage or "other", {"seconds": 0.0})
+        stage[name] = stage.get(name, 0) + n
+
+    def set(self, name, value):
+        self.values[name] = value
+
+    def to_dict(self):
+        self.end()
+        return {
+            "path": self.path,
+            "total_seconds": time.perf_counter() - self._created,
+            **self.values,
+            "stages": self.stages,
+        }
@@ -1,93 +1,75 @@
-from tree_sitter import Language, Parser
-import tree_sitter_swift as tsp_swift
-
-from method_generator import generate_method
+from method_generator import generate_method, CATALOGUE_VERSION
+from edit_buffer import EditBuffer
+from parser_pool import get_parser
+from name_allocator import NameAllocator
+from output_tree import write_file_atomic
+import plan_files
+import swift_queries
 
 import sys
 import re
+import collections
+import copy
+import hashlib
 import json
+import mmap
+import os
 import random
-import string
 
 # =====================
 # 载入配置，变量名池
 # =====================
 
 DEBUG = False  # 控制打印输出开关
+VERBOSE = True  # 每个文件保存后打印一行；大批量处理时由 batch_modify --quiet 关闭
+
+# 不小于该大小的输入用 mmap 读取并流式写出
+MMAP_THRESHOLD = 4 * 1024 * 1024
+
+with open("config.json", "rb") as f:
+    config_bytes = f.read()
+config = json.loads(config_bytes.decode("utf-8"))
+CONFIG_HASH = hashlib.sha256(config_bytes).hexdigest()
+
+variable_names_pool = tuple(config.get("bool_names", []))
 
-with open("config.json", "r", encoding="utf-8") as f:
-    config = json.load(f)
+# 所有随机函数都接收 rng（random.Random 实例），默认使用全局 random 模块。
+# 指定 --seed 时每个文件有独立的 rng，输出与处理顺序、进程数无关。
+# 生成的名字都经过 names（NameAllocator，与 rng 共用同一个随机数流），保证文件内不重名；
+# 各阶段未传入时按 rng 新建一个。
+# symbols 为项目符号表（symbol_table.SymbolTable）时，新名字还会避开项目里已有的全部标识符，
+# 别的文件里声明的 class 的 Bool 成员也可以在 extension 里使用。
 
-variable_names_pool = config.get("bool_names", [])
+def new_name_allocator(rng=random, symbols=None):
+    return NameAllocator(rng, variable_names_pool, reserved=symbols.identifiers if symbols is not None else None)
 
-def random_suffix():
-    return ''.join(random.choices(string.ascii_lowercase + string.digits, k=random.randint(8, 12)))
+def with_project_members(class_bool_map, symbols):
+    """
+    本文件的 class -> Bool 成员映射优先，查不到时再查符号表（别的文件里声明的 class）。
+    """
+    if symbols is None:
+        return class_bool_map
+    return collections.ChainMap(class_bool_map, symbols.class_members)
 
-def generate_variable_name():
-    return random.choice(variable_names_pool) + random_suffix().capitalize()
+def record_name_usage(metrics, names):
+    usage = names.usage()
+    metrics.set("names_allocated", sum(usage[kind]["allocated"] for kind in names.stats))
+    metrics.set("name_retries", sum(usage[kind]["retries"] for kind in names.stats))
 
-def generate_bool_declarations(count=1):
-    return [f"    var {generate_variable_name()}: Bool = {random.choice(['true','false'])}" for _ in range(count)]
+def generate_variable_name(rng=random, names=None):
+    if names is None:
+        names = new_name_allocator(rng)
+    return names.variable_name()
+
+def generate_bool_declarations(count=1, rng=random, names=None):
+    if names is None:
+        names = new_name_allocator(rng)
+    return [f"    var {names.variable_name()}: Bool = {rng.choice(['true','false'])}" for _ in range(count)]
 
 # =====================
 # Tree-sitter 辅助函数
 # =====================
 
-def find_class_nodes(node, results=None):
-    if results is None:
-        results = []
-    if node.type == "class_declaration":
-        is_class = False
-        type_name = "Unknown"
-        for child in node.children:
-            if child.type == "class":
-                is_class = True
-            # "extension"
-        if is_class:
-            results.append(node)
-        else:
-            if DEBUG: print(f"⚠️ 跳过 class extension")
-    for child in node.children:
-        find_class_nodes(child, results)
-    return results
-
-def find_class_body_brace_node(class_node):
-    for child in class_node.children:
-        if child.type == "class_body":
-            for grandchild in child.children:
-                if grandchild.type == "{":
-                    return grandchild
-    return None
-
-def recursive_find_functions(node, results=None):
-    if results is None:
-        results = []
-    if node.type == "function_declaration":
-        # 检查是不是在另一个函数的 function_body 里
-        parent = node.parent
-        inside_function = False
-        while parent is not None:
-            if parent.type in ("function_body", "statements"):
-                inside_function = True
-                break
-            parent = parent.parent
-        if not inside_function:
-            results.append(node)
-        else:
-            if DEBUG: print(f"⚠️ 跳过局部函数")
-    for child in node.children:
-        recursive_find_functions(child, results)
-    return results
-
-def recursive_find_classes(node, results=None):
-    if results is None:
-        results = []
-    if node.type == "class_declaration":
-        results.append(node)
-    for child in node.children:
-        recursive_find_classes(child, results)
-    return results
-
 def get_node_text(source_bytes, node):
     return source_bytes[node.start_byte:node.end_byte].decode('utf-8')
 
@@ -131,196 +113,359 @@ def extract_argument_pairs_from_tree(func_node, source_bytes):
     return arg_pairs
 
 def find_and_rebuild_parameters(node, source_code_bytes):
-    start_paren = end_paren = None
-    for child in node.children:
-        if child.type == '(' and start_paren is None:
-            start_paren = child
-        if child.type == ')':
-            end_paren = child
-    if start_paren and end_paren:
-        return start_paren, end_paren
-    for child in node.children:
-        sub_start, sub_end = find_and_rebuild_parameters(child, source_code_bytes)
-        if sub_start and sub_end:
-            return sub_start, sub_end
-    return None, None
-
-def extract_function_name(func_node, source_bytes):
-    # func_node 是 function_declaration 类型节点
-    for child in func_node.children:
-        if child.type == "simple_identifier":
-            return source_bytes[child.start_byte:child.end_byte].decode('utf-8')
-    return "unknown_func"
+    """
+    返回函数参数列表的 ( 和 ) 节点：优先取函数自身的第一个 ( 和最后一个 )，
+    否则按先序取第一个直接包含一对括号的子孙节点。
+    """
+    own = swift_queries.captures(swift_queries.FUNCTION_PARAMETERS, node, max_start_depth=0)
+    if own.get("open") and own.get("close"):
+        return own["open"][0], own["close"][-1]
+
+    owner = None
+    for match in swift_queries.matches(swift_queries.PARENTHESES, node):
+        candidate = match["owner"][0]
+        if candidate == node:
+            continue
+        if owner is None or (candidate.start_byte, -candidate.end_byte) < (owner.start_byte, -owner.end_byte):
+            owner = candidate
+    if owner is None:
+        return None, None
+    parens = [c for c in owner.children if c.type in ("(", ")")]
+    start_paren = next(c for c in parens if c.type == "(")
+    end_paren = [c for c in parens if c.type == ")"][-1]
+    return start_paren, end_paren
 
 def find_function_body_brace(func_node):
+    braces = swift_queries.captures(swift_queries.FUNCTION_BODIES, func_node, max_start_depth=0).get("brace", [])
+    return braces[0] if braces else None
+
+def has_throws_on_function(func_node, source_bytes):
+    """
+    检查 function_declaration 是否带 throws。
+    只在 simple_identifier 到 function_body 之间寻找 throws 节点。
+    包含两种情况：
+    - throws 节点
+    - user_type -> type_identifier == 'throws'
+    """
+    seen_name = False
     for child in func_node.children:
+        if not seen_name:
+            if child.type == "simple_identifier":
+                seen_name = True
+            continue
         if child.type == "function_body":
-            for grandchild in child.children:
-                if grandchild.type == "{":
-                    return grandchild
-    return None
+            break
+        if child.type == "throws":
+            return True
+        if child.type == "user_type":
+            # 遍历 user_type 的子节点，找 type_identifier
+            for gchild in child.children:
+                if gchild.type == "type_identifier":
+                    text = get_node_text(source_bytes, gchild)
+                    if text == "throws":
+                        return True
+    return False
+
+def analyze_function_returns(func_node, source_code_bytes):
+    for idx, child in enumerate(func_node.children):
+        if child.type == '->':
+            # 有返回值
+            next_node = func_node.children[idx + 1] if idx + 1 < len(func_node.children) else None
+            if next_node and next_node.type == "optional_type":
+                return "can_be_nil"
+            return "must_return"
+    return "no_return"
+
+def is_static_or_class_method(func_node):
+    """
+    检查 function_declaration 是否包含 static 或 class (包括 private static, private class 等多重修饰)
+    """
+    for child in func_node.children:
+        if child.type == "modifiers":
+            for mod_child in child.children:
+                if mod_child.type == "property_modifier":
+                    # 再向下看具体 static / class
+                    for sub_child in mod_child.children:
+                        if sub_child.type in ("static", "class"):
+                            return True
+                elif mod_child.type in ("static", "class"):
+                    return True
+        elif child.type in ("static", "class"):
+            return True
+        if child.type == "simple_identifier":
+            # 已过参数声明，提前停止
+            break
+    return False
 
 # =====================
-# 插入 class Bool 成员变量
+# 文件索引：一次遍历得到全部类型和函数的信息
 # =====================
 
-def insert_bool_properties_to_class(tree, source_code_bytes):
-    class_bool_map = {}
-    classes = find_class_nodes(tree.root_node)
-    classes.sort(key=lambda n: n.start_byte, reverse=True)
-    output_parts, last_index = [], len(source_code_bytes)
-
-    def get_full_class_name(node):
-        names = []
-        current = node
-        while current:
-            if current.type in ("class_declaration", "struct_declaration", "extension_declaration"):
-                for c in current.children:
-                    if c.type == "type_identifier":
-                        names.append(get_node_text(source_code_bytes, c))
-                        break
-            current = current.parent
-        names.reverse()
-        return ".".join(names) if names else "Unknown"
-
-    for cls in classes:
-        class_name = get_full_class_name(cls)
-
-        brace_node = find_class_body_brace_node(cls)
-        if not brace_node:
-            continue
+def _declared_type_name(class_node, source_bytes):
+    for c in class_node.children:
+        if c.type == "type_identifier":
+            return get_node_text(source_bytes, c)
+    return None
 
-        insert_pos = brace_node.end_byte
-        declarations = generate_bool_declarations(random.randint(1, 3))
-        bool_var_names = [d.split()[1].rstrip(":") for d in declarations]
-        class_bool_map[class_name] = bool_var_names
+def _type_name(class_node, source_bytes):
+    # 和 declared 不同，extension 的 user_type 名也计入（A.B 形式只取第一段）
+    type_name = None
+    for c in class_node.children:
+        if c.type == "type_identifier":
+            type_name = get_node_text(source_bytes, c)
+            break
+        elif c.type == "user_type":
+            for g in c.children:
+                if g.type == "type_identifier":
+                    type_name = get_node_text(source_bytes, g)
+                    break
+    return type_name
 
-        insert_text = "\n" + "\n".join(declarations)
-        output_parts.append(source_code_bytes[insert_pos:last_index])
-        output_parts.append(insert_text.encode('utf-8'))
-        last_index = insert_pos
+class FunctionInfo:
+    """
+    单个非局部函数的索引信息。只保存字节区间 (start, end) 和预先算好的标志，
+    不引用任何 Node，语法树在建完索引后即可释放。
+    """
+    __slots__ = ("name", "name_span", "type_path", "start_byte", "end_byte", "params_span", "signature",
+                 "body_span", "brace_span", "return_kind", "has_return", "optional_return",
+                 "throws", "static", "arg_pairs")
+
+    SPANS = ("name_span", "params_span", "body_span", "brace_span")
+
+    def __init__(self, name, name_span, type_path, start_byte, end_byte, params_span, signature,
+                 body_span, brace_span, return_kind, throws, static, arg_pairs):
+        self.name = name
+        self.name_span = name_span
+        self.type_path = type_path
+        self.start_byte = start_byte
+        self.end_byte = end_byte
+        self.params_span = params_span
+        self.signature = signature
+        self.body_span = body_span
+        self.brace_span = brace_span
+        self.return_kind = return_kind            # no_return / can_be_nil / must_return
+        self.has_return = return_kind != "no_return"
+        self.optional_return = return_kind == "can_be_nil"
+        self.throws = throws
+        self.static = static
+        self.arg_pairs = tuple(arg_pairs)
+
+    def moved(self, start_byte, end_byte, spans):
+        """
+        返回偏移替换后的副本，spans 为 {区间名: (start, end)}。
+        """
+        info = copy.copy(self)
+        info.start_byte = start_byte
+        info.end_byte = end_byte
+        for key, span in spans.items():
+            setattr(info, key, span)
+        return info
+
+class FileIndex:
+    """
+    对一棵语法树只做一次查询遍历，记录每个类型和非局部函数的信息，后续各阶段直接查表。
+
+    classes:   [{"kind", "type_path", "name_span", "start_byte", "end_byte", "brace_span"}]
+               type_path 只由带 type_identifier 的外层类型组成（extension 不计入），
+               与 class_bool_map 的 key 一致
+    functions: [FunctionInfo]，type_path 包含 extension 名，例如 A.B.C；找不到时为 "Unknown"
+    两个列表都按文档顺序排列。局部函数（位于其他函数的 function_body / statements 内）不收录。
+    with_functions 为 False 时只收集 classes（项目符号表预扫描用）。
+    """
 
-        if DEBUG: print(f"✅ 在 class {class_name} 插入 Bool {bool_var_names}")
+    def __init__(self, tree, source_bytes, with_functions=True):
+        self.source = source_bytes
+        self.classes = []
+        self.functions = []
+
+        found = swift_queries.captures(swift_queries.DECLARATIONS, tree.root_node)
+        nodes = [(n, "class") for n in found.get("class", [])]
+        if with_functions:
+            nodes += [(n, "function") for n in found.get("function", [])]
+            nodes += [(n, "scope") for n in found.get("scope", [])]
+        nodes.sort(key=lambda item: (item[0].start_byte, -item[0].end_byte))
+
+        # 按起点顺序扫描，用栈维护当前位置外层的类型和作用域，不需要向上遍历父节点
+        type_stack = []   # [(end_byte, declared_name, type_name)]
+        scope_ends = []
+        for node, kind in nodes:
+            while type_stack and type_stack[-1][0] <= node.start_byte:
+                type_stack.pop()
+            while scope_ends and scope_ends[-1] <= node.start_byte:
+                scope_ends.pop()
+
+            if kind == "scope":
+                scope_ends.append(node.end_byte)
+            elif kind == "class":
+                declared = _declared_type_name(node, source_bytes)
+                type_stack.append((node.end_byte, declared, _type_name(node, source_bytes)))
+                self.classes.append(self._class_entry(node, [t[1] for t in type_stack if t[1]]))
+            elif scope_ends:
+                if DEBUG: print(f"⚠️ 跳过局部函数")
+            else:
+                self.functions.append(self._function_entry(node, [t[2] for t in type_stack if t[2]]))
+
+    def _class_entry(self, node, names):
+        kind_node = node.child_by_field_name("declaration_kind")
+        name_node = next((c for c in node.children if c.type in ("type_identifier", "user_type")), None)
+        body_node = node.child_by_field_name("body")
+        brace_node = None
+        if body_node is not None and body_node.type == "class_body":
+            brace_node = next((c for c in body_node.children if c.type == "{"), None)
+        return {
+            "kind": kind_node.type if kind_node is not None else None,
+            "type_path": ".".join(names) if names else "Unknown",
+            "name_span": (name_node.start_byte, name_node.end_byte) if name_node else None,
+            "start_byte": node.start_byte,
+            "end_byte": node.end_byte,
+            "brace_span": (brace_node.start_byte, brace_node.end_byte) if brace_node else None,
+        }
+
+    def _function_entry(self, node, names):
+        source_bytes = self.source
+        name_node = next((c for c in node.children if c.type == "simple_identifier"), None)
+        start_paren, end_paren = find_and_rebuild_parameters(node, source_bytes)
+        body_node = next((c for c in node.children if c.type == "function_body"), None)
+        brace_node = find_function_body_brace(node)
+        type_path = ".".join(names) if names else "Unknown"
+
+        params_span = (start_paren.start_byte, end_paren.end_byte) if start_paren and end_paren else None
+        entry = FunctionInfo(
+            name=get_node_text(source_bytes, name_node) if name_node else None,
+            name_span=(name_node.start_byte, name_node.end_byte) if name_node else None,
+            type_path=type_path,
+            start_byte=node.start_byte,
+            end_byte=node.end_byte,
+            params_span=params_span,
+            signature=source_bytes[node.start_byte:params_span[1]].decode('utf-8') if params_span else "",
+            body_span=(body_node.start_byte, body_node.end_byte) if body_node else None,
+            brace_span=(brace_node.start_byte, brace_node.end_byte) if brace_node else None,
+            return_kind=analyze_function_returns(node, source_bytes),
+            throws=has_throws_on_function(node, source_bytes),
+            static=is_static_or_class_method(node),
+            arg_pairs=extract_argument_pairs_from_tree(node, source_bytes),
+        )
 
-    output_parts.append(source_code_bytes[:last_index])
-    new_source = b"".join(reversed(output_parts))
-    return new_source, class_bool_map
+        if DEBUG: print(f"🔍 函数 {entry.name} 属于类型 {type_path}")
+        return entry
 
 # =====================
-# 复制函数并添加 bool 参数
+# 插入 class Bool 成员变量
 # =====================
 
-def get_signature_string(func_node, source_bytes):
-    # 找参数括号节点
-    start_paren, end_paren = find_and_rebuild_parameters(func_node, source_bytes)
-    if not start_paren or not end_paren:
-        if DEBUG: print(f"⚠️ 未找到参数括号，跳过函数 {original_name}")
-        return ""
-
-    old_params = source_bytes[start_paren.start_byte:end_paren.end_byte].decode('utf-8')
-    prefix = source_bytes[func_node.start_byte:start_paren.start_byte].decode('utf-8')
-
-    return prefix + old_params
-
-def extract_function_info(func_node, source_bytes):
-    """
-    提取函数信息，包括：
-    - name: 函数名称
-    - signature: 方法签名（包含参数）
-    - header: 到 { 的部分（用于显示）
-    - body: 函数体 {...}
-    - full_code: 整个函数代码
-    - start_byte, end_byte: 位置
-    - class_name: 所属的 class / struct / extension 名称
-    """
-    info = {
-        "name": None,
-        "params": None,
-        "return_type": None,
-        "header": None,
-        "body": None,
-        "full_code": None,
-        "start_byte": func_node.start_byte,
-        "end_byte": func_node.end_byte,
-        "func_node": func_node,
-        "class_name": "Unknown"
-    }
-
-    # 提取函数名、body
-    for child in func_node.children:
-        if child.type == "simple_identifier":
-            info["name"] = get_node_text(source_bytes, child)
-        if child.type == "function_body":
-            info["body"] = get_node_text(source_bytes, child)
+def bool_property_targets(classes):
+    """
+    需要插入 Bool 成员的 class 条目，按抽取随机数的顺序（从文件末尾往前）排列。
+    """
+    targets = [c for c in classes if c["kind"] == "class"]
+    targets.sort(key=lambda c: c["start_byte"], reverse=True)
+    return targets
 
-    # 提取 signature
-    info["signature"] = get_signature_string(func_node, source_bytes)
+def draw_bool_members(rng=random, names=None):
+    """
+    为一个 class 抽取 1～3 个 Bool 成员，返回 (声明行列表, 变量名列表)。
+    """
+    declarations = generate_bool_declarations(rng.randint(1, 3), rng, names)
+    return declarations, [d.split()[1].rstrip(":") for d in declarations]
 
-    # 提取 header（到 {）
-    func_code = get_node_text(source_bytes, func_node)
-    brace_pos = func_code.find("{")
-    info["header"] = func_code[:brace_pos].strip() if brace_pos > -1 else func_code.strip()
+def plan_bool_properties(index, buffer, rng=random, metrics=None, names=None):
+    """
+    把每个 class 需要插入的 Bool 成员记录到 buffer（EditBuffer），返回 class_bool_map。
+    """
+    class_bool_map = {}
 
-    info["full_code"] = func_code
+    for cls in bool_property_targets(index.classes):
+        class_name = cls["type_path"]
 
-    # ✅ 支持完整嵌套路径 class/struct/extension/enum，例如 A.B.C
-    parent = func_node
-    type_stack = []
+        if not cls["brace_span"]:
+            if metrics: metrics.add("classes_skipped")
+            continue
 
-    while parent is not None:
-        if parent.type in ("class_declaration", "struct_declaration", "extension_declaration", "enum_declaration"):
-            type_name = None
-            for c in parent.children:
-                if c.type == "type_identifier":
-                    type_name = get_node_text(source_bytes, c)
-                    break
-                elif c.type == "user_type":
-                    for g in c.children:
-                        if g.type == "type_identifier":
-                            type_name = get_node_text(source_bytes, g)
-                            break
-            if type_name:
-                type_stack.append(type_name)
-        parent = parent.parent
+        insert_pos = cls["brace_span"][1]
+        declarations, bool_var_names = draw_bool_members(rng, names)
+        class_bool_map[class_name] = bool_var_names
+
+        insert_text = "\n" + "\n".join(declarations)
+        buffer.insert(insert_pos, insert_text.encode('utf-8'))
+
+        if DEBUG: print(f"✅ 在 class {class_name} 插入 Bool {bool_var_names}")
+        if metrics: metrics.add("classes_matched")
+
+    return class_bool_map
 
-    type_stack.reverse()
-    info["class_name"] = ".".join(type_stack) if type_stack else "Unknown"
+def insert_bool_properties_to_class(tree, source_code_bytes, rng=random, metrics=None, names=None):
+    buffer = EditBuffer(source_code_bytes)
+    class_bool_map = plan_bool_properties(FileIndex(tree, source_code_bytes), buffer, rng, metrics, names)
+    return buffer.to_bytes(), class_bool_map
 
-    if DEBUG: print(f"🔍 函数 {info['name']} 属于类型 {info['class_name']}")
-    return info
+# =====================
+# 复制函数并添加 bool 参数
+# =====================
 
-def generate_copied_functions(tree, source_code_bytes):
-    function_nodes = recursive_find_functions(tree.root_node)
-    function_nodes.sort(key=lambda n: n.start_byte)  # 顺序处理
+class CopyRecord:
+    """
+    一个原函数及其复制函数的信息。function 是原函数的 FunctionInfo（偏移对应生成复制时的源码），
+    同时作为该记录的唯一标识，后续阶段按它映射偏移而不是按签名文本查找。
+    """
+    __slots__ = ("function", "new_name", "bool_param", "copied_signature", "new_func_code", "copy_brace_offset")
+
+    def __init__(self, function, new_name, bool_param, copied_signature, new_func_code, copy_brace_offset):
+        self.function = function
+        self.new_name = new_name
+        self.bool_param = bool_param
+        self.copied_signature = copied_signature
+        self.new_func_code = new_func_code
+        self.copy_brace_offset = copy_brace_offset  # 复制函数体 { 之后在 new_func_code 中的字节位置
+
+    @property
+    def original_name(self):
+        return self.function.name
+
+    @property
+    def original_signature(self):
+        return self.function.signature
+
+    @property
+    def class_name(self):
+        # 所属类型路径，例如 A.B.C
+        return self.function.type_path
+
+def generate_copied_functions(index, pending=None, rng=random, metrics=None, names=None):
+    """
+    pending 为记录了尚未应用编辑的 EditBuffer（单次解析模式下是 Bool 插入），
+    复制出的函数体和缩进按应用编辑后的内容计算。
+    """
+    source_code_bytes = index.source
+    if pending is None:
+        pending = EditBuffer(source_code_bytes)
+    if names is None:
+        names = new_name_allocator(rng)
 
     function_map = []
 
-    for func in function_nodes:
-        info = extract_function_info(func, source_code_bytes)
-        original_name = info["name"]
-        original_signature = info.get("signature", "")
+    for func in index.functions:
+        original_name = func.name
         if original_name is None:
+            if metrics: metrics.add("functions_skipped")
             continue
 
-        fr = random_suffix().capitalize()
-        sr = random_suffix().capitalize()
+        new_name = names.function_name()
+        bool_param = names.variable_name()
 
-        new_name = "d3e" + fr + sr
-        bool_param = generate_variable_name()
-
-        # 找参数括号节点
-        start_paren, end_paren = find_and_rebuild_parameters(func, source_code_bytes)
-        if not start_paren or not end_paren:
+        # 参数括号位置
+        if not func.params_span:
             if DEBUG: print(f"⚠️ 未找到参数括号，跳过函数 {original_name}")
+            if metrics: metrics.add("functions_skipped")
             continue
+        params_start, params_end = func.params_span
 
-        old_params = source_code_bytes[start_paren.start_byte:end_paren.end_byte].decode('utf-8')
+        old_params = source_code_bytes[params_start:params_end].decode('utf-8')
         if old_params == '()':
             new_params = f'({bool_param}: Bool = false)'
         else:
             new_params = old_params[:-1] + f', {bool_param}: Bool = false)'
 
-        prefix = source_code_bytes[func.start_byte:start_paren.start_byte].decode('utf-8')
+        prefix = source_code_bytes[func.start_byte:params_start].decode('utf-8')
 
         # 去除 override 关键字
         prefix_no_override = re.sub(r'\boverride\s+', '', prefix)
@@ -329,10 +474,9 @@ def generate_copied_functions(tree, source_code_bytes):
         copied_signature = re.sub(r'\b' + re.escape(original_name) + r'\b', new_name, prefix_no_override, count=1) + new_params
         # copied_signature = copied_signature.replace(" ", "")
 
-        body = source_code_bytes[end_paren.end_byte:func.end_byte].decode('utf-8')
+        body = pending.slice(params_end, func.end_byte).decode('utf-8')
 
-        start_line_start = source_code_bytes.rfind(b'\n', 0, func.start_byte) + 1
-        line_indent = source_code_bytes[start_line_start:func.start_byte].decode('utf-8')
+        line_indent = pending.line_prefix(func.start_byte).decode('utf-8')
         if not line_indent.strip():
             indent = line_indent
         else:
@@ -340,107 +484,91 @@ def generate_copied_functions(tree, source_code_bytes):
 
         new_func_code = indent + copied_signature + body
 
-        # ➡️ 查找父类名 (支持 class / struct / extension)
-        parent = func
-        type_stack = []
-
-        while parent is not None:
-            if parent.type in ("class_declaration", "struct_declaration", "extension_declaration", "enum_declaration"):
-                type_name = None
-                for c in parent.children:
-                    if c.type == "type_identifier":
-                        type_name = get_node_text(source_code_bytes, c)
-                        break
-                    elif c.type == "user_type":
-                        for g in c.children:
-                            if g.type == "type_identifier":
-                                type_name = get_node_text(source_code_bytes, g)
-                                break
-                if type_name:
-                    type_stack.append(type_name)
-            parent = parent.parent
-
-        type_stack.reverse()
-        class_path = ".".join(type_stack) if type_stack else "Unknown"
-
-        # 保存信息
-        function_map.append({
-            "original_name": original_name,
-            "new_name": new_name,
-            "bool_param": bool_param,
-            "original_signature": original_signature,
-            "copied_signature": copied_signature,
-            "new_func_code": new_func_code,
-            "func_node": func,
-            "class_name": class_path  # ✅ 新增
-        })
-
-        if DEBUG: print(f"✅ 复制函数 {original_name} -> {new_name}，添加参数 {bool_param}\n原签名:\n{original_signature}\n复制签名:\n{copied_signature}\n")
+        # 复制函数体 { 之后在 new_func_code 中的字节位置，插入 if 逻辑时直接定位，不需要重新解析
+        copy_brace_offset = None
+        if func.brace_span:
+            copy_brace_offset = (len(indent.encode('utf-8')) + len(copied_signature.encode('utf-8'))
+                                 + func.brace_span[1] - params_end)
 
-    return function_map
+        function_map.append(CopyRecord(func, new_name, bool_param, copied_signature, new_func_code, copy_brace_offset))
 
-def insert_copied_functions_after_originals(source_bytes, function_map):
-    output_parts = []
-    last_index = len(source_bytes)
+        if metrics: metrics.add("functions_matched")
+        if DEBUG: print(f"✅ 复制函数 {original_name} -> {new_name}，添加参数 {bool_param}\n原签名:\n{func.signature}\n复制签名:\n{copied_signature}\n")
 
-    # 倒序处理避免插入位置偏移
-    for record in sorted(function_map, key=lambda r: r["func_node"].end_byte, reverse=True):
-        insert_pos = record["func_node"].end_byte
-        copied_code = "\n\n" + record["new_func_code"]
+    return function_map
 
-        output_parts.append(source_bytes[insert_pos:last_index])
-        output_parts.append(copied_code.encode('utf-8'))
-        last_index = insert_pos
+COPY_SEPARATOR = b"\n\n"  # 复制函数文本之前的分隔
 
-    output_parts.append(source_bytes[:last_index])
-    return b"".join(reversed(output_parts))
+def plan_copied_functions(buffer, function_map):
+    """
+    把每个复制函数插到原函数之后，编辑记录到 buffer（index.source 之上的 EditBuffer），返回各编辑 id。
+    """
+    return [buffer.insert(record.function.end_byte, COPY_SEPARATOR + record.new_func_code.encode('utf-8'))
+            for record in function_map]
 
 # =====================
-# 改写原函数调用复制函数
+# 按标识映射偏移
 # =====================
+# 每条记录以原函数的索引条目为标识（偏移对应复制之前的源码）。后续阶段不再重新解析、
+# 按签名文本查找函数，而是把这些偏移经过前面各阶段的 EditBuffer 映射到当前源码上，
+# 一次遍历完成；两个重载签名文本相同时也不会混淆。
 
-def has_throws_on_function(func_node, source_bytes):
+def map_function_entries(functions, buffer):
     """
-    检查 function_declaration 是否带 throws。
-    只在 simple_identifier 到 function_body 之间寻找 throws 节点。
-    包含两种情况：
-    - throws 节点
-    - user_type -> type_identifier == 'throws'
+    把函数条目（偏移对应 buffer.source）映射到 buffer 应用编辑后的坐标，返回新的条目列表，原条目不变。
+    区间起点之前、终点之后恰好有插入时，插入内容都不计入区间。
     """
-    seen_name = False
-    for child in func_node.children:
-        if not seen_name:
-            if child.type == "simple_identifier":
-                seen_name = True
-            continue
-        if child.type == "function_body":
-            break
-        if child.type == "throws":
-            return True
-        if child.type == "user_type":
-            # 遍历 user_type 的子节点，找 type_identifier
-            for gchild in child.children:
-                if gchild.type == "type_identifier":
-                    text = get_node_text(source_bytes, gchild)
-                    if text == "throws":
-                        return True
-    return False
+    starts = []
+    ends = []
+    for func in functions:
+        starts.append(func.start_byte)
+        ends.append(func.end_byte)
+        for key in FunctionInfo.SPANS:
+            span = getattr(func, key)
+            if span:
+                starts.append(span[0])
+                ends.append(span[1])
+    starts = iter(buffer.map_offsets(starts, after_inserts=True))
+    ends = iter(buffer.map_offsets(ends, after_inserts=False))
+
+    mapped = []
+    for func in functions:
+        start_byte, end_byte = next(starts), next(ends)
+        spans = {key: (next(starts), next(ends)) for key in FunctionInfo.SPANS if getattr(func, key)}
+        mapped.append(func.moved(start_byte, end_byte, spans))
+    return mapped
+
+def copy_brace_positions(function_map, copies):
+    """
+    返回每个复制函数体 { 之后在 copies 应用编辑后的偏移，没有函数体的记录为 None。
+    copies 为插入复制函数的 EditBuffer（见 plan_copied_functions）。
+    """
+    # 复制函数插在原函数 end_byte，映射时不计入该位置的插入，得到的就是复制文本的起点
+    copy_starts = copies.map_offsets([r.function.end_byte for r in function_map], after_inserts=False)
+    return [start + len(COPY_SEPARATOR) + r.copy_brace_offset if r.copy_brace_offset is not None else None
+            for start, r in zip(copy_starts, function_map)]
+
+# =====================
+# 改写原函数调用复制函数
+# =====================
 
-def rewrite_single_function_body(source_bytes, func_node, record):
+def plan_function_body_rewrite(source_bytes, func, record, pending=None):
     """
-    对单个 function_node 使用 record 重写函数体，并返回新的 bytes。
+    计算把单个函数（FileIndex 函数条目）的函数体改写为调用复制函数的编辑 (start, end, text_bytes)。
+    pending 为记录了尚未应用编辑的 EditBuffer，仅用于按应用后的内容计算缩进。
+    找不到函数体时返回 None。
     """
-    new_name = record["new_name"]
-    bool_param = record["bool_param"]
-    signature = record["original_signature"]
+    new_name = record.new_name
+    bool_param = record.bool_param
+    signature = record.original_signature
 
-    has_return_type = any(child.type == '->' for child in func_node.children)
+    has_return_type = func.has_return
     if DEBUG: print(f"🔎 函数 {signature} 是否有返回值: {has_return_type}")
 
-    has_throws = has_throws_on_function(func_node, source_bytes)
+    has_throws = func.throws
     if DEBUG: print(f"🔎 函数 {signature} 是否有错误抛出: {has_throws}")
 
-    arg_pairs = extract_argument_pairs_from_tree(func_node, source_bytes)
+    arg_pairs = func.arg_pairs
     if DEBUG: print(f"📌 提取到的参数对: {arg_pairs}")
     call_args = ", ".join(arg_pairs)
     if call_args:
@@ -449,14 +577,15 @@ def rewrite_single_function_body(source_bytes, func_node, record):
         call_args = f"{bool_param}: false"
     if DEBUG: print(f"🚀 重组调用参数为: {call_args}")
 
-    body_node = next((c for c in func_node.children if c.type == "function_body"), None)
-    if not body_node:
+    if not func.body_span:
         if DEBUG: print(f"⚠️ 未找到 {signature} 的 function_body，跳过改写")
-        return source_bytes  # 返回原始
+        return None
+    body_start, body_end = func.body_span
 
     # 获取缩进
-    line_start = source_bytes.rfind(b'\n', 0, body_node.start_byte) + 1
-    line = source_bytes[line_start:body_node.start_byte].decode('utf-8')
+    if pending is None:
+        pending = EditBuffer(source_bytes)
+    line = pending.line_prefix(body_start).decode('utf-8')
     indent_match = re.match(r'\s*', line)
     indent = indent_match.group(0) if indent_match else ""
     if DEBUG: print(f"📝 检测到缩进: '{indent}'")
@@ -473,150 +602,67 @@ def rewrite_single_function_body(source_bytes, func_node, record):
         new_body = f"{indent}{{\n{indent}    {call_line}\n{indent}}}"
     if DEBUG: print(f"✍️ 替换后的函数体:\n{new_body}")
 
-    # 替换
-    new_bytes = bytearray(source_bytes)
-    new_bytes[body_node.start_byte:body_node.end_byte] = new_body.encode('utf-8')
-
     if DEBUG: print(f"✅ 已将 {signature} 改写为调用 {new_name}（{'带 return' if has_return_type else '无 return'}）")
-    return bytes(new_bytes)
-
-def rewrite_original_functions_to_call_copies(tree, source_bytes, function_map, parser):
-    # 用 (class_name, signature) 作为唯一 key
-    signature_map = {(r["class_name"], r["original_signature"]): r for r in function_map}
-    modified_signatures = set()
-
-    round_count = 0
-    while len(modified_signatures) < len(signature_map):
-        round_count += 1
-        tree = parser.parse(source_bytes)
-        func_nodes = recursive_find_functions(tree.root_node)
-
-        if DEBUG: print(f"\n===== 🔄 Round {round_count}：共解析到 {len(func_nodes)} 个函数 =====")
-        if DEBUG: print(f"✅ 已改写函数: {list(modified_signatures)}")
-        if DEBUG: print(f"🕐 待改写函数: {[key for key in signature_map.keys() if key not in modified_signatures]}")
-
-        modified_this_round = 0
-
-        for func_node in func_nodes:
-            info = extract_function_info(func_node, source_bytes)
-            signature = info.get("signature")
-            class_name = info.get("class_name", "Unknown")
-            signature_key = (class_name, signature)
-
-            if DEBUG: print(f"\n🔍 准备尝试改写函数: {signature} in class {class_name}")
-
-            if signature_key in signature_map and signature_key not in modified_signatures:
-                if DEBUG: print(f"\n🔍 尝试改写函数: {signature} in class {class_name}")
-                record = signature_map[signature_key]
-                source_bytes = rewrite_single_function_body(source_bytes, func_node, record)
-                modified_signatures.add(signature_key)
-                modified_this_round += 1
-
-        if modified_this_round == 0:
-            if DEBUG: print("⚠️ 本轮未找到可改写的函数，可能已经全部完成或有剩余未匹配函数。")
-            break
+    return (body_start, body_end, new_body.encode('utf-8'))
 
+def rewrite_single_function_body(buffer, func, record):
+    """
+    对单个函数使用 record 重写函数体，编辑记录到 buffer（EditBuffer）。
+    func 为 FileIndex 函数条目，偏移对应 buffer.source；返回是否改写。
+    """
+    edit = plan_function_body_rewrite(buffer.source, func, record, buffer)
+    if edit is None:
+        return False
+    buffer.replace(*edit)
+    return True
+
+def rewrite_original_functions_to_call_copies(buffer, function_map, copies, metrics=None):
+    """
+    buffer 为 copies.to_bytes() 之上的 EditBuffer。每条记录的原函数经 copies 映射到当前偏移后
+    直接改写，一次遍历完成。
+    """
+    functions = map_function_entries([record.function for record in function_map], copies)
+    applied = 0
+    for func, record in zip(functions, function_map):
+        if DEBUG: print(f"\n🔍 尝试改写函数: {func.signature} in class {record.class_name}")
+        applied += rewrite_single_function_body(buffer, func, record)
+
+    if metrics:
+        metrics.add("functions_matched", applied)
+        metrics.add("functions_skipped", len(function_map) - applied)
     if DEBUG: print("\n🎉 所有函数改写完成。")
-    return source_bytes
+    return applied
 
 # =====================
 # 插入If调用逻辑
 # =====================
 
-def analyze_function_returns(func_node, source_code_bytes):
-    for idx, child in enumerate(func_node.children):
-        if child.type == '->':
-            # 有返回值
-            next_node = func_node.children[idx + 1] if idx + 1 < len(func_node.children) else None
-            if next_node and next_node.type == "optional_type":
-                return "can_be_nil"
-            return "must_return"
-    return "no_return"
-
-def is_optional_node(node):
-    if node.type == "optional_type":
-        return True
-    for child in node.children:
-        if is_optional_node(child):
-            return True
-    return False
-
-def is_static_or_class_method(func_node):
+def build_if_logic(func, record, class_bool_map, rng=random, names=None):
     """
-    检查 function_declaration 是否包含 static 或 class (包括 private static, private class 等多重修饰)
+    生成插入到复制函数 { 之后的假方法 + if/defer 逻辑文本。
+    func 为 FileIndex 函数条目，可以是复制函数本身，也可以是原函数（两者返回类型和修饰符一致）。
     """
-    for child in func_node.children:
-        if child.type == "modifiers":
-            for mod_child in child.children:
-                if mod_child.type == "property_modifier":
-                    # 再向下看具体 static / class
-                    for sub_child in mod_child.children:
-                        if sub_child.type in ("static", "class"):
-                            return True
-                elif mod_child.type in ("static", "class"):
-                    return True
-        elif child.type in ("static", "class"):
-            return True
-        if child.type == "simple_identifier":
-            # 已过参数声明，提前停止
-            break
-    return False
+    param_bool = record.bool_param
+    class_name = record.class_name
 
-def insert_if_into_single_function_body(source_bytes, func_node, record, class_bool_map):
-    new_name = record["new_name"]
-    param_bool = record["bool_param"]
-    class_name = record.get("class_name", "Unknown")
-    copied_signature = record["copied_signature"]
-
-    body_node = next((c for c in func_node.children if c.type == "function_body"), None)
-    if not body_node:
-        if DEBUG: print(f"⚠️ 未在 {new_name} 找到 function_body，跳过")
-        return source_bytes
-
-    brace_node = find_function_body_brace(func_node)
-    if not brace_node:
-        return source_bytes
-
-    # 判断函数返回类型
-    return_type = analyze_function_returns(func_node, source_bytes)
-
-    # 随机选一个假方法模板
-    fake_method_code = generate_method(has_return=False)
+    # 随机选一个假方法模板，方法名由模板目录直接给出，不需要再解析生成的代码
+    fake_method_code, need_call_func_name = generate_method(has_return=False, rng=rng, names=names)
     if DEBUG: print("=== fake_method_code ===")
     if DEBUG: print(fake_method_code)
 
-    SWIFT_LANGUAGE = Language(tsp_swift.language())
-    parser = Parser(language=SWIFT_LANGUAGE)
-
-    call_method_tree = parser.parse(fake_method_code.encode('utf-8'))
-    call_method_root_node = call_method_tree.root_node
-    if DEBUG: print("=== Parsed tree root node ===")
-    if DEBUG: print(f"root_node type: {call_method_root_node.type}, children count: {len(call_method_root_node.children)}")
-
-    need_call_func_name = None
-    for child in call_method_root_node.children:
-        if DEBUG: print(f"child type: {child.type}")
-        if child.type == "function_declaration":
-            need_call_func_name = extract_function_name(child, fake_method_code.encode('utf-8'))
-            if DEBUG: print(f"Extracted function name: {need_call_func_name}")
-
     # 调用假方法
-    fake_call = ""
-    if need_call_func_name:
-        fake_call = f"{need_call_func_name}()"
-    else:
-        fake_call = ""
+    fake_call = f"{need_call_func_name}()"
 
     if DEBUG: print(f"Fake call string: {fake_call}")
 
-    if is_static_or_class_method(func_node):
+    if func.static:
         # 类方法，不用 self 访问成员变量
         condition = f"{param_bool}"
         message = f"{param_bool} is true"
     else:
         member_bools = class_bool_map.get(class_name, [])
         if class_name != "Unknown" and member_bools:
-            member_var = random.choice(member_bools)
+            member_var = rng.choice(member_bools)
             condition = f"self.{member_var} && {param_bool}"
             message = f"Both flags are true (self.{member_var} & {param_bool})"  
         else:
@@ -624,7 +670,7 @@ def insert_if_into_single_function_body(source_bytes, func_node, record, class_b
             message = f"{param_bool} is true"
 
     # 根据返回情况生成插入代码
-    if return_type == "no_return":
+    if not func.has_return:
         insert_logic = f"""
             {fake_method_code}
 
@@ -635,7 +681,7 @@ def insert_if_into_single_function_body(source_bytes, func_node, record, class_b
                 return
             }}
         """
-    elif return_type == "can_be_nil":
+    elif func.optional_return:
         insert_logic = f"""
             {fake_method_code}
 
@@ -659,93 +705,301 @@ def insert_if_into_single_function_body(source_bytes, func_node, record, class_b
             }}
         """
 
-    # 缩进
-    line_start = source_bytes.rfind(b'\n', 0, body_node.start_byte) + 1
-    line = source_bytes[line_start:body_node.start_byte].decode('utf-8')
-    indent_match = re.match(r'\s*', line)
-    indent = indent_match.group(0) if indent_match else ""
+    if DEBUG: print(f"✅ 已生成 {record.new_name} 的 if 逻辑: {condition}")
+    return insert_logic
+
+def insert_if_to_copied_functions(buffer, function_map, copies, rewrites, class_bool_map, rng=random, metrics=None,
+                                  names=None):
+    """
+    buffer 为 rewrites.to_bytes() 之上的 EditBuffer；copies 插入了复制函数，rewrites 改写了原函数体
+    （rewrites.source == copies.to_bytes()）。复制函数 { 的位置由记录直接算出，再经 rewrites 映射，
+    按文档顺序一次遍历插入。
+    """
+    positions = copy_brace_positions(function_map, copies)
+    present = [pos for pos in positions if pos is not None]
+    mapped = iter(rewrites.map_offsets(present))
+    applied = 0
+    for record, pos in zip(function_map, positions):
+        if pos is None:
+            if DEBUG: print(f"⚠️ 未在 {record.new_name} 找到 function_body，跳过")
+            continue
+        # 复制函数与原函数返回类型、修饰符一致，直接用原函数的索引条目
+        insert_logic = build_if_logic(record.function, record, class_bool_map, rng, names)
+        buffer.insert(next(mapped), insert_logic.encode('utf-8'))
+        applied += 1
+        if DEBUG: print(f"✅ 已在 {record.new_name} 中插入 if 逻辑")
+
+    if metrics:
+        metrics.add("functions_matched", applied)
+        metrics.add("functions_skipped", len(function_map) - applied)
+    if DEBUG: print("\n🎉 所有复制函数插入 if 完成。")
+    return applied
 
+# =====================
+# 单次解析模式：一棵语法树生成完整编辑计划
+# =====================
 
-    # 插入到 { 后面
-    insert_pos = brace_node.end_byte
-    new_bytes = bytearray(source_bytes)
-    new_bytes[insert_pos:insert_pos] = insert_logic.encode('utf-8')
+def parse_and_index(parser, source_bytes, metrics=None):
+    """
+    解析并建立 FileIndex。索引只保存偏移，返回前语法树就已释放。
+    """
+    if metrics:
+        metrics.begin("parse")
+        metrics.add("parses")
+    tree = parser.parse(source_bytes)
+    if metrics: metrics.begin("index")
+    index = FileIndex(tree, source_bytes)
+    del tree
+    return index
+
+def build_edit_plan(index, rng=random, metrics=None, names=None, symbols=None):
+    """
+    只基于原始文件的索引（一次解析），把全部编辑按原始偏移记录到一个 EditBuffer 并返回：
+    Bool 成员插入、复制函数插入（已包含 if 逻辑）、原函数体改写。
+    随机数的消耗顺序与分阶段流程一致，固定 seed 时输出相同。
+    """
+    buffer = EditBuffer(index.source)
+    if names is None:
+        names = new_name_allocator(rng, symbols)
+
+    # 1. class Bool 成员
+    if metrics: metrics.begin("insert_bools")
+    class_bool_map = with_project_members(plan_bool_properties(index, buffer, rng, metrics, names), symbols)
+
+    # 2. 复制函数信息（函数体包含其内部的 Bool 插入）
+    if metrics: metrics.begin("generate_copies")
+    function_map = generate_copied_functions(index, buffer, rng, metrics, names)
+
+    # 3. 复制函数插在原函数之后；先用不含 if 逻辑的文本，保证第 4 步的缩进计算与分阶段流程一致
+    if metrics: metrics.begin("insert_copies")
+    copy_edit_ids = plan_copied_functions(buffer, function_map)
+
+    # 4. 每条记录改写自己的原函数体
+    if metrics: metrics.begin("rewrite_originals")
+    applied = 0
+    for record in function_map:
+        applied += rewrite_single_function_body(buffer, record.function, record)
+    if metrics:
+        metrics.add("functions_matched", applied)
+        metrics.add("functions_skipped", len(function_map) - applied)
+
+    # 5. 把 if 逻辑拼进复制函数文本中函数体 { 之后的位置
+    if metrics: metrics.begin("insert_ifs")
+    for edit_id, record in zip(copy_edit_ids, function_map):
+        if record.copy_brace_offset is None:
+            if metrics: metrics.add("functions_skipped")
+            continue
+        if metrics: metrics.add("functions_matched")
+        insert_logic = build_if_logic(record.function, record, class_bool_map, rng, names)
 
-    if DEBUG: print(f"✅ 已在 {new_name} 中插入 if 逻辑: {condition}")
-    return bytes(new_bytes)
+        copy_text = buffer.text_of(edit_id)
+        split_at = len(COPY_SEPARATOR) + record.copy_brace_offset
+        buffer.set_text(edit_id, copy_text[:split_at] + insert_logic.encode('utf-8') + copy_text[split_at:])
 
-def insert_if_to_copied_functions(tree, source_bytes, function_map, parser, class_bool_map):
-    signature_map = {r["copied_signature"]: r for r in function_map}
-    modified_signatures = set()
+    if metrics: record_name_usage(metrics, names)
+    return buffer
 
-    round_count = 0
-    while len(modified_signatures) < len(signature_map):
-        round_count += 1
-        tree = parser.parse(source_bytes)
-        func_nodes = recursive_find_functions(tree.root_node)
+# =====================
+# 主流程
+# =====================
 
-        if DEBUG: print(f"\n===== 🔄 Round {round_count}：共解析到 {len(func_nodes)} 个函数 =====")
-        if DEBUG: print(f"✅ 已插入 if 的函数签名: {list(modified_signatures)}")
-        if DEBUG: print(f"🕐 待插入 if 的函数签名: {[sig for sig in signature_map.keys() if sig not in modified_signatures]}")
+def file_rng(seed, relpath):
+    """
+    由全局 seed 和文件相对路径派生该文件独立的随机数流，返回 (rng, file_seed)。
+    seed 为 None 时使用全局 random 模块，file_seed 为 None。
+    file_seed 同时作为缓存 key 和计划文件的一部分。
+    """
+    if seed is None:
+        return random, None
+    file_seed = f"{seed}:{relpath}"
+    return random.Random(file_seed), file_seed
 
-        modified_this_round = 0
+def transform_source(source_code, parser=None, single_parse=False, rng=random, metrics=None, names=None,
+                     symbols=None):
+    """
+    对内存中的源码做完整转换，返回新的 bytes，不做任何文件读写。
+    names 为多个文件共用的 NameAllocator 时，生成的名字在这些文件之间也不重复。
+    symbols 为项目符号表时，名字避开项目已有标识符，并可使用别的文件中 class 的 Bool 成员。
+    """
+    # 未传入 parser 时使用本线程共享的 parser，整个进程只构造一次 Language
+    if parser is None:
+        parser = get_parser()
 
-        for func_node in func_nodes:
-            info = extract_function_info(func_node, source_bytes)
-            signature = info.get("signature")
-            if DEBUG: print(f"\n🔓 准备处理方法并 if: {signature}")
-            if signature in signature_map and signature not in modified_signatures:
-                if DEBUG: print(f"\n🔍 尝试在复制函数中插入 if: {signature}")
-                record = signature_map[signature]
-                source_bytes = insert_if_into_single_function_body(source_bytes, func_node, record, class_bool_map)
-                modified_signatures.add(signature)
-                modified_this_round += 1
+    if not single_parse:
+        return run_staged_pipeline(source_code, parser, rng, metrics, names, symbols)
 
-        if modified_this_round == 0:
-            if DEBUG: print("⚠️ 本轮未找到可插入 if 的函数，可能已全部完成或有剩余未匹配函数。")
-            break
+    # 只解析一次，生成全部编辑后一次性拼接
+    buffer = build_edit_plan(parse_and_index(parser, source_code, metrics), rng, metrics, names, symbols)
+    if metrics: metrics.begin("splice")
+    return buffer.to_bytes()
 
-    if DEBUG: print("\n🎉 所有复制函数插入 if 完成。")
-    return source_bytes
+def process_swift_file(source_path, parser=None, single_parse=False, cache=None, seed=None, relpath=None,
+                       output_path=None, metrics=None, names=None, symbols=None):
+    """
+    cache 为 TransformCache 时，先按输入内容查缓存，命中则直接写出缓存的结果。
+    seed 不为 None 时使用由 (seed, relpath) 派生的独立随机数流，relpath 默认为 source_path。
+    output_path 为 None 时原地覆盖 source_path，否则写到 output_path（目录需已存在）。
 
+    不小于 MMAP_THRESHOLD 的大文件通过 mmap 读取，总是走单次解析模式，
+    结果按片段直接流式写入输出文件，不在内存中拼出完整结果。
 
-# =====================
-# 主流程
-# =====================
+    metrics 为 FileMetrics 时记录各阶段耗时和计数，为 None 时不做任何统计。
+
+    names 为多个文件共用的 NameAllocator 时名字在这些文件间唯一，结果依赖处理顺序，不要与 cache 同时使用。
+    symbols 为项目符号表时，其摘要计入缓存 key。
 
-def process_swift_file(source_path):
-    source_code = open(source_path, 'rb').read()
+    返回本文件生成的名字列表。命中缓存时返回缓存条目记录的名字，条目没有记录（旧版本写入）时返回 None。
+    """
+    if output_path is None:
+        output_path = source_path
+
+    rng, file_seed = file_rng(seed, relpath if relpath is not None else source_path)
+    names = names.with_rng(rng) if names is not None else new_name_allocator(rng, symbols)
+
+    if metrics: metrics.begin("read")
+    with open(source_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        large = size >= MMAP_THRESHOLD
+        source_code = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if large else f.read()
+    if metrics:
+        metrics.set("bytes_in", size)
+        metrics.set("mode", "stream" if large else ("single_parse" if single_parse else "staged"))
+
+    try:
+        cache_key = None
+        if cache is not None:
+            if metrics: metrics.begin("cache")
+            key_seed = file_seed if symbols is None else f"{file_seed}:symbols{symbols.digest()}"
+            cache_key = cache.key(source_code, seed=key_seed)
+            cached = cache.get(cache_key)
+            if metrics: metrics.set("cache", "hit" if cached is not None else "miss")
+            if cached is not None:
+                if metrics: metrics.begin("write")
+                write_file_atomic(output_path, lambda f: f.write(cached), mode_from=source_path)
+                if metrics: metrics.set("bytes_out", len(cached))
+                if VERBOSE: print(f"♻️ 命中缓存，文件已保存：{output_path}")
+                return cache.get_names(cache_key)
+
+        if large:
+            if parser is None:
+                parser = get_parser()
+            buffer = build_edit_plan(parse_and_index(parser, source_code, metrics), rng, metrics, names, symbols)
+            if metrics: metrics.begin("write")
+            write_file_atomic(output_path, buffer.write_to, mode_from=source_path)
+            del buffer
+            if metrics: metrics.set("bytes_out", os.path.getsize(output_path))
+            if cache is not None:
+                cache.put_file(cache_key, output_path, names.issued)
+            if VERBOSE: print(f"✅ 文件已保存（流式写入）：{output_path}")
+            return names.issued
+
+        new_source = transform_source(source_code, parser, single_parse, rng, metrics, names, symbols)
+    finally:
+        if large:
+            source_code.close()
+
+    if metrics:
+        metrics.begin("write")
+        metrics.set("bytes_out", len(new_source))
+    if cache is not None:
+        cache.put(cache_key, new_source, names.issued)
+
+    # 先写临时文件再 rename：输出路径可能是上次出错时链接到源文件的硬链接，直接截断会改掉源文件
+    write_file_atomic(output_path, lambda f: f.write(new_source), mode_from=source_path)
+    if metrics: metrics.end()
+    if VERBOSE: print(f"✅ 文件已保存：{output_path}")
+    return names.issued
+
+def plan_meta(file_seed):
+    """
+    写入计划文件头的附加信息。
+    """
+    return {"seed": file_seed, "config_hash": CONFIG_HASH, "catalogue_version": CATALOGUE_VERSION}
 
-    SWIFT_LANGUAGE = Language(tsp_swift.language())
-    parser = Parser(language=SWIFT_LANGUAGE)
+def analyze_swift_file(source_path, plan_path, parser=None, seed=None, relpath=None, metrics=None, names=None,
+                       symbols=None):
+    """
+    analyze 阶段：按单次解析模式生成编辑计划并写入 plan_path，不修改源文件。
+    随机数流与 process_swift_file 相同，固定 seed 时 apply 的结果与直接处理一致。
+    返回本文件生成的名字列表。
+    """
+    if relpath is None:
+        relpath = source_path
+    rng, file_seed = file_rng(seed, relpath)
+    names = names.with_rng(rng) if names is not None else new_name_allocator(rng, symbols)
+
+    if metrics: metrics.begin("read")
+    with open(source_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        large = size >= MMAP_THRESHOLD
+        source_code = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if large else f.read()
+    if metrics:
+        metrics.set("bytes_in", size)
+        metrics.set("mode", "analyze")
+
+    try:
+        if parser is None:
+            parser = get_parser()
+        edits = build_edit_plan(parse_and_index(parser, source_code, metrics), rng, metrics, names, symbols).edits()
+
+        if metrics: metrics.begin("write")
+        plan_files.write_plan(plan_path, relpath, source_code, edits, meta=plan_meta(file_seed))
+        if metrics:
+            metrics.set("bytes_out", os.path.getsize(plan_path))
+            metrics.end()
+    finally:
+        if large:
+            source_code.close()
+    if VERBOSE: print(f"📝 编辑计划已保存：{plan_path}")
+    return names.issued
+
+def run_staged_pipeline(source_code, parser, rng=random, metrics=None, names=None, symbols=None):
+    """
+    原始的分阶段流程：每个阶段重新解析并生成新的 bytes。
+    """
+    if names is None:
+        names = new_name_allocator(rng, symbols)
 
     # 第一步: 插入 class 成员
+    if metrics:
+        metrics.begin("insert_bools")
+        metrics.add("parses")
     tree = parser.parse(source_code)
-    new_source, class_bool_map = insert_bool_properties_to_class(tree, source_code)
+    new_source, class_bool_map = insert_bool_properties_to_class(tree, source_code, rng, metrics, names)
+    del tree  # 下一次解析之前释放，同一时刻最多只有一棵语法树
+    class_bool_map = with_project_members(class_bool_map, symbols)
 
-    # 2. 生成复制函数信息
-    tree = parser.parse(new_source)
-    function_map = generate_copied_functions(tree, new_source)
+    # 2. 生成复制函数信息；记录只保存偏移，索引建完语法树即释放
+    if metrics:
+        metrics.begin("generate_copies")
+        metrics.add("parses")
+    function_map = generate_copied_functions(FileIndex(parser.parse(new_source), new_source), rng=rng, metrics=metrics,
+                                             names=names)
 
     # 3. 将复制函数插入到原函数后
-    new_source = insert_copied_functions_after_originals(new_source, function_map)
+    if metrics: metrics.begin("insert_copies")
+    copies = EditBuffer(new_source)
+    plan_copied_functions(copies, function_map)
+    new_source = copies.to_bytes()
 
-    # 4. 改写原函数为调用复制函数
-    tree = parser.parse(new_source)
-    new_source = rewrite_original_functions_to_call_copies(tree, new_source, function_map, parser)
+    # 4. 改写原函数为调用复制函数（按记录标识映射偏移，不再解析）
+    if metrics: metrics.begin("rewrite_originals")
+    rewrites = EditBuffer(new_source)
+    rewrite_original_functions_to_call_copies(rewrites, function_map, copies, metrics)
+    new_source = rewrites.to_bytes()
 
     # 5. 在复制函数内插入 if 调用
-    tree = parser.parse(new_source)
-    new_source = insert_if_to_copied_functions(tree, new_source, function_map, parser, class_bool_map)
+    if metrics: metrics.begin("insert_ifs")
+    ifs = EditBuffer(new_source)
+    insert_if_to_copied_functions(ifs, function_map, copies, rewrites, class_bool_map, rng, metrics, names)
+    new_source = ifs.to_bytes()
+    if metrics: record_name_usage(metrics, names)
 
     # # 6. 打印结果
     # print("\n===== 最终修改后的文件内容 =====\n")
     # print(new_source.decode('utf-8'))
 
-    # 7. 想保存就解开：
-    with open(source_path, "wb") as f:
-        f.write(new_source)
-    print(f"✅ 文件已保存：{source_path}")
+    return new_source
 
 # =====================
 # 脚本入口
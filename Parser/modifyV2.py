@@ -252,32 +252,13 @@ def insert_if_to_functions(tree, source_code_bytes, class_bool_map, function_boo
         # 判断函数返回类型
         return_type = analyze_function_returns(func, source_code_bytes)
 
-        # 随机选一个假方法模板
-        fake_method_code = generate_method(has_return=False)
+        # 随机选一个假方法模板，方法名由模板目录直接给出
+        fake_method_code, need_call_func_name = generate_method(has_return=False)
         print("=== fake_method_code ===")
         print(fake_method_code)
 
-        SWIFT_LANGUAGE = Language(tsp_swift.language())
-        parser = Parser(language=SWIFT_LANGUAGE)
-
-        call_method_tree = parser.parse(fake_method_code.encode('utf-8'))
-        call_method_root_node = call_method_tree.root_node
-        print("=== Parsed tree root node ===")
-        print(f"root_node type: {call_method_root_node.type}, children count: {len(call_method_root_node.children)}")
-
-        need_call_func_name = None
-        for child in call_method_root_node.children:
-            print(f"child type: {child.type}")
-            if child.type == "function_declaration":
-                need_call_func_name = extract_function_name(child, fake_method_code.encode('utf-8'))
-                print(f"Extracted function name: {need_call_func_name}")
-
         # 调用假方法
-        fake_call = ""
-        if need_call_func_name:
-            fake_call = f"{need_call_func_name}()"
-        else:
-            fake_call = ""
+        fake_call = f"{need_call_func_name}()"
 
         print(f"Fake call string: {fake_call}")
 
@@ -0,0 +1,192 @@
+import copy
+import hashlib
+import random
+import string
+from array import array
+
+from method_generator import verbs, nouns, draw_method_name
+
+# =====================
+# 生成标识符的分配器
+# =====================
+# 所有生成的名字（复制函数名、Bool 成员 / 参数名、假方法名）都经过同一个分配器，
+# 保证在一个文件（或调用方共用同一个分配器时，整个项目）内不重复。
+#
+# 第一次抽取与原来逐个生成时的随机数消耗完全相同，只有真的撞名时才重新抽取，
+# 因此不撞名的文件输出不变。已用名字只记录 64 位指纹，存放在开放寻址的 array 里，
+# 每个名字约 8～16 字节，项目级别的几百万个名字也不会占用太多内存。
+# 指纹相同（概率约 2^-64）只会导致一次多余的重抽，不会产生重名。
+#
+# 名字不成批预先抽取：每个名字的抽取与同一随机数流上的其他抽取交替进行（Bool 初值、模板选择、
+# 每个 class 的成员个数等），预先抽一批会改变随机数的消耗顺序，固定 --seed 的输出、缓存结果、
+# 编辑计划和符号表预先算出的 Bool 成员名都会随之变化。单个名字的开销本来就小：
+# 名字池是 tuple，rng.choice 为 O(1)；随机后缀由一次 rng.choices 生成。
+
+# 分配规则变化时递增；会计入缓存 key，旧的缓存结果（可能含重名）随之失效
+ALLOCATOR_VERSION = 1
+
+SUFFIX_ALPHABET = string.ascii_lowercase + string.digits
+MAX_RETRIES = 16  # 同一个名字池连续撞名超过该次数后改用带随机后缀的名字，不再重抽
+POOL_SATURATION = 0.9  # 有限名字池已用超过该比例后，撞名时直接加后缀，不再重抽
+
+def random_suffix(rng=random):
+    return ''.join(rng.choices(SUFFIX_ALPHABET, k=rng.randint(8, 12)))
+
+def fingerprint(name):
+    value = int.from_bytes(hashlib.blake2b(name.encode("utf-8"), digest_size=8).digest(), "little")
+    return value or 1  # 0 表示空槽
+
+class FingerprintSet:
+    """
+    只存 64 位指纹的开放寻址哈希集合（线性探测），装载因子超过 2/3 时扩容一倍。
+    """
+
+    def __init__(self, capacity=64):
+        size = 8
+        while size * 2 < capacity * 3:
+            size *= 2
+        self._slots = array("Q", bytes(8 * size))
+        self._mask = size - 1
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def _find(self, value):
+        slots = self._slots
+        index = value & self._mask
+        while slots[index] and slots[index] != value:
+            index = (index + 1) & self._mask
+        return index
+
+    def add(self, value):
+        """
+        加入指纹，已存在时返回 False。
+        """
+        index = self._find(value)
+        if self._slots[index]:
+            return False
+        self._slots[index] = value
+        self._count += 1
+        if self._count * 3 > len(self._slots) * 2:
+            self._grow()
+        return True
+
+    def __contains__(self, value):
+        return bool(self._slots[self._find(value)])
+
+    def __iter__(self):
+        return (value for value in self._slots if value)
+
+    def _grow(self):
+        old = self._slots
+        self._slots = array("Q", bytes(16 * len(old)))
+        self._mask = len(self._slots) - 1
+        for value in old:
+            if value:
+                self._slots[self._find(value)] = value
+
+    def nbytes(self):
+        return self._slots.itemsize * len(self._slots)
+
+class NameAllocator:
+    """
+    rng: 随机数来源，与调用方其余的随机抽取共用同一个流。
+    variable_pool: config.json 中的 bool_names，转成 tuple，rng.choice 为 O(1)。
+    reserved: 只读的 FingerprintSet（例如项目符号表里的全部标识符），其中的名字不会被分配；
+              多个分配器共用同一个，不复制。
+    """
+
+    def __init__(self, rng=random, variable_pool=(), reserved=None):
+        self.rng = rng
+        self.variable_pool = tuple(variable_pool)
+        self.reserved = reserved
+        self._used = FingerprintSet()
+        self.issued = []  # 本次（本文件）分配出的名字，按分配顺序；用于写名字清单
+        # 每种名字：已分配数、重抽次数、追加了后缀的个数、名字池容量（None 表示名字本身带随机后缀，实际上不会用完）
+        self.stats = {
+            "function": {"allocated": 0, "retries": 0, "suffixed": 0, "capacity": None},
+            "variable": {"allocated": 0, "retries": 0, "suffixed": 0, "capacity": None},
+            "method": {"allocated": 0, "retries": 0, "suffixed": 0, "capacity": len(set(verbs)) * len(set(nouns))},
+        }
+
+    def with_rng(self, rng):
+        """
+        返回使用另一个随机数流、但共用已用名字和统计的分配器。
+        项目范围内每个文件有自己的 rng（--seed），名字仍然全项目唯一。
+        """
+        allocator = copy.copy(self)
+        allocator.rng = rng
+        allocator.issued = []
+        return allocator
+
+    def reserve(self, names):
+        """
+        把已存在的标识符（例如源码里原有的名字）标记为已占用，之后不会再分配。
+        """
+        for name in names:
+            self._used.add(fingerprint(name))
+
+    def _claim(self, name):
+        value = fingerprint(name)
+        if self.reserved is not None and value in self.reserved:
+            return False
+        return self._used.add(value)
+
+    def _pool_used(self, stats):
+        return (stats["allocated"] - stats["suffixed"]) / stats["capacity"] if stats["capacity"] else 0.0
+
+    def _allocate(self, kind, draw):
+        stats = self.stats[kind]
+        # 名字池快用完时重抽几乎总是失败，只抽一次（保持随机数消耗），撞名就直接加后缀
+        attempts = 1 if self._pool_used(stats) >= POOL_SATURATION else MAX_RETRIES
+        for attempt in range(attempts):
+            if attempt:
+                stats["retries"] += 1
+            name = draw()
+            if self._claim(name):
+                stats["allocated"] += 1
+                self.issued.append(name)
+                return name
+        while True:
+            candidate = name + random_suffix(self.rng).capitalize()
+            if self._claim(candidate):
+                stats["allocated"] += 1
+                stats["suffixed"] += 1
+                self.issued.append(candidate)
+                return candidate
+            stats["retries"] += 1
+
+    def function_name(self):
+        rng = self.rng
+        return self._allocate("function", lambda: "d3e" + random_suffix(rng).capitalize() + random_suffix(rng).capitalize())
+
+    def variable_name(self):
+        rng = self.rng
+        pool = self.variable_pool
+        return self._allocate("variable", lambda: rng.choice(pool) + random_suffix(rng).capitalize())
+
+    def method_name(self):
+        rng = self.rng
+        return self._allocate("method", lambda: draw_method_name(rng))
+
+    def usage(self):
+        """
+        返回 {kind: {"allocated", "retries", "suffixed", "capacity", "used_ratio"}}，另附 "fingerprint_bytes"。
+        used_ratio 为有限名字池已用的比例；接近 1 时新名字大多要追加后缀，说明该名字池对这个范围来说太小了。
+        """
+        report = {}
+        for kind, stats in self.stats.items():
+            report[kind] = dict(stats, used_ratio=self._pool_used(stats))
+        report["fingerprint_bytes"] = self._used.nbytes()
+        return report
+
+def format_usage(usage):
+    parts = []
+    for kind in ("function", "variable", "method"):
+        stats = usage[kind]
+        text = f"{kind} {stats['allocated']} 个（重抽 {stats['retries']} 次"
+        if stats["capacity"]:
+            text += f"，名字池已用 {stats['used_ratio']:.1%}，加后缀 {stats['suffixed']} 个"
+        parts.append(text + "）")
+    return "🏷️ 名字分配：" + "，".join(parts) + f"，指纹表 {usage['fingerprint_bytes'] // 1024} KB"
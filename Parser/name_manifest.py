@@ -0,0 +1,57 @@
+import json
+import os
+
+from output_tree import write_file_atomic
+
+# =====================
+# 生成名字清单
+# =====================
+# 记录每个文件上次处理时生成的名字：{"version": 1, "commit": "...", "files": {"相对路径": [名字, ...]}}。
+# 增量处理（--since）只重新处理变更的文件，清单随之更新：删除的文件去掉，重命名的文件换成新路径，
+# 重新处理的文件换成新生成的名字。--unique-names project 时其余文件的名字都登记为已占用，
+# 增量生成的名字不会与未重新处理的文件撞名。
+
+MANIFEST_VERSION = 1
+
+class NameManifest:
+    def __init__(self, path):
+        self.path = path
+        self.commit = None
+        self.files = {}
+
+    @classmethod
+    def load(cls, path):
+        """
+        文件不存在或版本不同时返回空清单。
+        """
+        manifest = cls(path)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return manifest
+        if data.get("version") == MANIFEST_VERSION:
+            manifest.commit = data.get("commit")
+            manifest.files = data.get("files", {})
+        return manifest
+
+    def record(self, relpath, names):
+        self.files[relpath] = list(names)
+
+    def remove(self, relpath):
+        self.files.pop(relpath, None)
+
+    def rename(self, old_path, new_path):
+        if old_path in self.files:
+            self.files[new_path] = self.files.pop(old_path)
+
+    def all_names(self):
+        for names in self.files.values():
+            yield from names
+
+    def save(self, commit=None):
+        if commit is not None:
+            self.commit = commit
+        data = {"version": MANIFEST_VERSION, "commit": self.commit, "files": dict(sorted(self.files.items()))}
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        write_file_atomic(self.path, lambda f: f.write(json.dumps(data, ensure_ascii=False, indent=1).encode("utf-8")))
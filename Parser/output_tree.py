@@ -0,0 +1,108 @@
+import errno
+import fcntl
+import os
+import shutil
+
+# =====================
+# 输出镜像目录
+# =====================
+# 把输入目录镜像到输出目录：.swift 文件由调用方转换后写入，其余文件尽量不复制数据：
+# 先尝试硬链接，跨文件系统等失败时尝试 reflink（FICLONE，btrfs / xfs 等支持），
+# 都不行才真正复制。
+# 注意：硬链接的文件与原文件共享 inode，之后不要原地修改输出目录里的非 Swift 文件。
+
+FICLONE = 0x40049409  # linux/fs.h: _IOW(0x94, 9, int)
+
+def reflink(src, dst):
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        except OSError:
+            fdst.close()
+            os.remove(dst)
+            raise
+    shutil.copystat(src, dst)
+
+def link_or_copy(src, dst):
+    """
+    返回实际使用的方式："hardlink" / "reflink" / "copy"。
+    """
+    try:
+        os.link(src, dst)
+        return "hardlink"
+    except FileExistsError:
+        os.remove(dst)
+        return link_or_copy(src, dst)
+    except OSError as e:
+        if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP, errno.EACCES):
+            raise
+    try:
+        reflink(src, dst)
+        return "reflink"
+    except OSError:
+        pass
+    shutil.copy2(src, dst)
+    return "copy"
+
+def write_file_atomic(output_path, write, mode_from=None):
+    """
+    write(f) 把内容写进同目录下的临时文件，完成后 rename 到 output_path。
+    原地覆盖一个仍被 mmap 的输入文件时必须这样做，不能直接截断原文件。
+    """
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            write(f)
+        if mode_from is not None:
+            shutil.copymode(mode_from, tmp_path)
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def iter_mirror_tree(root_dir, output_dir, counts, is_source=lambda name: name.endswith(".swift")):
+    """
+    用 os.scandir 深度优先遍历，边遍历边镜像：进入目录时创建对应的输出目录，
+    非源文件当场链接（按方式累加到 counts），源文件以 (full_path, relpath, output_path) 产出。
+    内存占用只与待访问的目录数有关，与文件总数无关。
+    与 os.walk 一致，不进入指向目录的符号链接。
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    stack = [(root_dir, "")]
+    while stack:
+        directory, rel_dir = stack.pop()
+        out_dir = os.path.join(output_dir, *rel_dir.split("/")) if rel_dir else output_dir
+        if rel_dir:
+            # 父目录总在子目录之前出栈，每个目录只需一次 mkdir
+            try:
+                os.mkdir(out_dir)
+            except FileExistsError:
+                pass
+        try:
+            entries = os.scandir(directory)
+        except OSError:
+            continue  # 与 os.walk 一致：无法读取的目录直接跳过
+        subdirs = []
+        with entries:
+            for entry in entries:
+                relpath = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                if entry.is_dir():
+                    if not entry.is_symlink():
+                        subdirs.append((entry.path, relpath))
+                    continue
+                out_path = os.path.join(out_dir, entry.name)
+                if is_source(entry.name):
+                    yield entry.path, relpath, out_path
+                else:
+                    counts[link_or_copy(entry.path, out_path)] += 1
+        stack.extend(reversed(subdirs))
+
+def mirror_tree(root_dir, output_dir, is_source=lambda name: name.endswith(".swift")):
+    """
+    一次性完成镜像，返回 (源文件列表 [(full_path, relpath, output_path)], 各方式的文件数)。
+    需要边遍历边处理时用 iter_mirror_tree。
+    """
+    counts = {"hardlink": 0, "reflink": 0, "copy": 0}
+    sources = list(iter_mirror_tree(root_dir, output_dir, counts, is_source))
+    return sources, counts
@@ -0,0 +1,42 @@
+import threading
+
+from tree_sitter import Language, Parser
+import tree_sitter_swift as tsp_swift
+
+# =====================
+# 进程内共享的 Language / Parser
+# =====================
+# Language 每个进程只构造一次，所有 parser 和查询共用；
+# Parser 每个线程一个（tree-sitter 的 Parser 不能被多个线程同时使用），
+# 每次取出时先 reset，清掉上一次被中断的解析状态。
+
+_language = None
+_language_lock = threading.Lock()
+_local = threading.local()
+
+# 本进程构造 Language 的次数，正常情况下始终 <= 1
+LANGUAGE_BUILDS = 0
+
+def get_language():
+    global _language, LANGUAGE_BUILDS
+    if _language is None:
+        with _language_lock:
+            if _language is None:
+                _language = Language(tsp_swift.language())
+                LANGUAGE_BUILDS += 1
+    return _language
+
+def get_parser():
+    """
+    返回当前线程的 parser，已 reset，可以直接 parse。
+    """
+    parser = getattr(_local, "parser", None)
+    if parser is None:
+        parser = Parser(language=get_language())
+        _local.parser = parser
+    else:
+        parser.reset()
+    return parser
+
+def language_build_count():
+    return LANGUAGE_BUILDS
@@ -0,0 +1,144 @@
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import sys
+
+from edit_buffer import EditBuffer
+from output_tree import mirror_tree, write_file_atomic
+
+# =====================
+# 编辑计划文件（analyze / apply 两阶段）
+# =====================
+# analyze 阶段解析源文件，把全部编辑按原始字节偏移写成计划文件；
+# apply 阶段只校验输入 hash 并拼接，不依赖 tree-sitter（本模块不 import 任何解析相关代码），
+# 可以在没有安装 tree-sitter 的构建机上运行。
+#
+# 计划文件是 JSON，每条编辑单独一行，便于查看和 diff：
+# {"version": 1, "path": "相对路径", "input_sha256": "...", "input_size": 123, ...,
+#  "edits": [
+#  [start, end, "插入文本"],
+#  ...
+#  ]}
+
+PLAN_VERSION = 1
+PLAN_SUFFIX = ".plan.json"
+
+# 与 modify.MMAP_THRESHOLD 一致：大文件用 mmap 读取，流式写出
+MMAP_THRESHOLD = 4 * 1024 * 1024
+
+def plan_path_for(plan_dir, relpath):
+    return os.path.join(plan_dir, *relpath.split("/")) + PLAN_SUFFIX
+
+def hash_source(source_bytes):
+    return hashlib.sha256(source_bytes).hexdigest()
+
+def dump_plan(f, relpath, source_bytes, edits, meta=None):
+    """
+    把计划写入二进制文件对象 f。
+    edits: [(start, end, text_bytes)]，按原始偏移排序。
+    meta 中的字段（seed、模板目录版本等）原样写入文件头，apply 时不使用。
+    """
+    header = {
+        "version": PLAN_VERSION,
+        "path": relpath,
+        "input_sha256": hash_source(source_bytes),
+        "input_size": len(source_bytes),
+        **(meta or {}),
+    }
+    head = json.dumps(header, ensure_ascii=False)[:-1]
+    f.write(f'{head}, "edits": [\n'.encode("utf-8"))
+    for index, (start, end, text) in enumerate(edits):
+        line = json.dumps([start, end, text.decode("utf-8", "surrogateescape")], ensure_ascii=False)
+        f.write((line + (",\n" if index < len(edits) - 1 else "\n")).encode("utf-8", "surrogateescape"))
+    f.write(b"]}\n")
+
+def write_plan(plan_path, relpath, source_bytes, edits, meta=None):
+    os.makedirs(os.path.dirname(plan_path) or ".", exist_ok=True)
+    write_file_atomic(plan_path, lambda f: dump_plan(f, relpath, source_bytes, edits, meta))
+
+def read_plan(plan_path):
+    with open(plan_path, "rb") as f:
+        plan = json.loads(f.read().decode("utf-8", "surrogateescape"))
+    if plan.get("version") != PLAN_VERSION:
+        raise ValueError(f"不支持的计划文件版本 {plan.get('version')}：{plan_path}")
+    plan["edits"] = [(start, end, text.encode("utf-8", "surrogateescape")) for start, end, text in plan["edits"]]
+    return plan
+
+def apply_plan(plan, source_path, output_path=None):
+    """
+    校验 source_path 与计划记录的输入一致后拼接写出，返回输出字节数。
+    输入已经变化（hash 不同）时抛出 ValueError，不写任何内容。
+    """
+    if output_path is None:
+        output_path = source_path
+
+    with open(source_path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        large = size >= MMAP_THRESHOLD
+        source = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if large else f.read()
+    try:
+        if size != plan["input_size"] or hash_source(source) != plan["input_sha256"]:
+            raise ValueError(f"输入已变化，计划已过期：{source_path}")
+        buffer = EditBuffer(source)
+        for start, end, text in plan["edits"]:
+            buffer.replace(start, end, text)
+        write_file_atomic(output_path, buffer.write_to, mode_from=source_path)
+    finally:
+        if large:
+            source.close()
+    return os.path.getsize(output_path)
+
+def iter_plan_files(plan_dir):
+    for dirpath, _, filenames in os.walk(plan_dir):
+        for filename in filenames:
+            if filename.endswith(PLAN_SUFFIX):
+                yield os.path.join(dirpath, filename)
+
+def apply_plans(plan_dir, root_dir, output_dir=None):
+    """
+    把 plan_dir 下的全部计划应用到 root_dir。output_dir 为空时原地覆盖，
+    否则写到镜像目录（非 Swift 文件硬链接过去，没有计划的 Swift 文件视为失败）。
+    返回出错文件列表 [(path, error), ...]。
+    """
+    failures = []
+    applied = 0
+
+    if output_dir:
+        tasks, _ = mirror_tree(root_dir, output_dir)
+        tasks = [(full_path, plan_path_for(plan_dir, relpath), output_path)
+                 for full_path, relpath, output_path in tasks]
+    else:
+        tasks = []
+        for plan_path in iter_plan_files(plan_dir):
+            relpath = os.path.relpath(plan_path, plan_dir)[:-len(PLAN_SUFFIX)].replace(os.sep, "/")
+            tasks.append((os.path.join(root_dir, *relpath.split("/")), plan_path, None))
+
+    for full_path, plan_path, output_path in tasks:
+        try:
+            if not os.path.exists(plan_path):
+                raise FileNotFoundError(f"缺少编辑计划 {plan_path}")
+            apply_plan(read_plan(plan_path), full_path, output_path)
+            applied += 1
+        except Exception as e:
+            print(f"⚠️ 应用计划到 {full_path} 时出错: {e}")
+            failures.append((full_path, f"{type(e).__name__}: {e}"))
+
+    print(f"✅ 已应用 {applied} 个计划，失败 {len(failures)} 个")
+    return failures
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="把 analyze 生成的编辑计划应用到源码目录（不需要 tree-sitter）")
+    arg_parser.add_argument("plan_directory", help="batch_modify --analyze 输出的计划目录")
+    arg_parser.add_argument("root_directory", help="要应用计划的源码根目录")
+    arg_parser.add_argument("--output-dir", help="写到镜像目录而不是原地覆盖")
+    args = arg_parser.parse_args()
+
+    for directory in (args.plan_directory, args.root_directory):
+        if not os.path.isdir(directory):
+            print(f"错误：{directory} 不是有效目录")
+            sys.exit(1)
+
+    failures = apply_plans(args.plan_directory, args.root_directory, args.output_dir)
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,70 @@
+import threading
+
+from tree_sitter import Query, QueryCursor
+
+from parser_pool import get_language
+
+# =====================
+# 预编译的 Swift 语法查询
+# =====================
+# 查询在每个进程内首次使用时编译一次，之后所有 finder 共用。
+# 匹配全部在 tree-sitter 的 C 代码里完成，不在 Python 里递归遍历节点，
+# 所以嵌套很深的生成代码也不会触发 Python 的递归深度限制。
+
+# 文件索引用：全部类型声明、函数声明，以及局部作用域
+DECLARATIONS = """
+(class_declaration) @class
+(function_declaration) @function
+(function_body) @scope
+(statements) @scope
+"""
+
+# 函数自身的参数括号
+FUNCTION_PARAMETERS = """
+(function_declaration "(" @open ")" @close) @function
+"""
+
+# 任意节点直接包含的一对括号，用于函数本身找不到括号时向下查找
+PARENTHESES = """
+(_ "(" @open ")" @close) @owner
+"""
+
+# 函数体及其 {
+FUNCTION_BODIES = """
+(function_declaration body: (function_body "{" @brace) @body) @function
+"""
+
+_queries = {}
+_lock = threading.Lock()
+
+def get_query(source):
+    query = _queries.get(source)
+    if query is None:
+        with _lock:
+            query = _queries.get(source)
+            if query is None:
+                query = Query(get_language(), source)
+                _queries[source] = query
+    return query
+
+def _cursor(source, max_start_depth):
+    cursor = QueryCursor(get_query(source))
+    if max_start_depth is not None:
+        cursor.set_max_start_depth(max_start_depth)
+    return cursor
+
+def captures(source, node, max_start_depth=None):
+    """
+    返回 {capture_name: [Node, ...]}，同一 capture 内的节点按起始位置排序。
+    max_start_depth=0 表示只匹配以 node 本身为根的模式。
+    """
+    result = _cursor(source, max_start_depth).captures(node)
+    for nodes in result.values():
+        nodes.sort(key=lambda n: (n.start_byte, -n.end_byte))
+    return result
+
+def matches(source, node, max_start_depth=None):
+    """
+    返回 [{capture_name: [Node, ...]}, ...]，每个元素对应一次完整匹配。
+    """
+    return [match for _, match in _cursor(source, max_start_depth).matches(node)]
@@ -0,0 +1,112 @@
+import hashlib
+import json
+import re
+import sys
+import time
+from array import array
+from multiprocessing import Pool
+
+from modify import FileIndex, bool_property_targets, draw_bool_members, file_rng, new_name_allocator
+from name_allocator import FingerprintSet, fingerprint
+from parser_pool import get_parser
+
+# =====================
+# 项目符号表
+# =====================
+# 正式处理之前先扫描整个项目一遍，得到：
+# - identifiers：所有文件里出现过的标识符（64 位指纹，FingerprintSet），生成名字时避开它们；
+# - class_members：每个 class 将要插入的 Bool 成员名，extension 写在别的文件里时也能用 self.xxx。
+#
+# Bool 成员名由每个文件自己的随机数流（--seed + 相对路径）决定，预扫描按处理时完全相同的
+# 顺序和分配器状态抽取一遍，所以这里记录的名字就是处理该文件时实际插入的名字。
+# 因此符号表要求固定 seed，且每个文件独立分配名字（--unique-names file）。
+#
+# 标识符用正则直接在字节上提取，会把注释、字符串里的单词也算进去，只会多避开一些名字，
+# 比再遍历一次语法树快得多。class 需要层级和 { 位置，仍然解析，但不分析函数。
+
+IDENTIFIER = re.compile(rb"[A-Za-z_][A-Za-z0-9_]*")
+
+class SymbolTable:
+    """
+    构建完成后只读。多进程时随 Pool 的 initargs 传给 worker（fork 时不复制）。
+    """
+
+    def __init__(self):
+        self.identifiers = FingerprintSet()
+        self.class_members = {}   # type_path -> (Bool 成员名, ...)，只含全项目只声明一次的 class
+        self.ambiguous = set()    # 在多个文件或同一文件中多次声明的 type_path，不参与跨文件查找
+        self.files = 0
+        self._digest = None
+
+    def digest(self):
+        """
+        符号表内容的指纹，计入缓存 key：符号表变化时处理结果也可能变化。
+        """
+        if self._digest is None:
+            h = hashlib.sha256()
+            h.update(array("Q", sorted(self.identifiers)).tobytes())
+            h.update(json.dumps(sorted(self.class_members.items())).encode("utf-8"))
+            self._digest = h.hexdigest()[:16]
+        return self._digest
+
+def identifier_fingerprints(source):
+    return array("Q", (fingerprint(name.decode("ascii")) for name in set(IDENTIFIER.findall(source))))
+
+def scan_file(task):
+    """
+    task: (full_path, relpath)。返回 (relpath, 标识符指纹 array, class 条目列表)。
+    """
+    full_path, relpath = task
+    with open(full_path, "rb") as f:
+        source = f.read()
+    fingerprints = identifier_fingerprints(source)
+    tree = get_parser().parse(source)
+    classes = FileIndex(tree, source, with_functions=False).classes
+    del tree
+    return relpath, fingerprints, [c for c in classes if c["kind"] == "class"]
+
+def build_symbol_table(files, seed, jobs=1, chunksize=16):
+    """
+    files: [(full_path, relpath)]，应为整个项目的全部 Swift 文件。
+    """
+    table = SymbolTable()
+    file_classes = {}
+
+    if jobs > 1:
+        with Pool(processes=jobs, initializer=get_parser) as pool:
+            scans = list(pool.imap_unordered(scan_file, files, chunksize=chunksize))
+    else:
+        scans = map(scan_file, files)
+    for relpath, fingerprints, classes in scans:
+        table.files += 1
+        for value in fingerprints:
+            table.identifiers.add(value)
+        if classes:
+            file_classes[relpath] = classes
+
+    # 所有标识符都收集完后，才能按处理时的分配器状态抽取 Bool 成员名
+    members = {}
+    for relpath in sorted(file_classes):
+        rng, _ = file_rng(seed, relpath)
+        names = new_name_allocator(rng, table)
+        for cls in bool_property_targets(file_classes[relpath]):
+            if not cls["brace_span"]:
+                continue
+            _, bool_names = draw_bool_members(rng, names)
+            type_path = sys.intern(cls["type_path"])
+            if type_path in members or type_path in table.ambiguous:
+                table.ambiguous.add(type_path)
+                members.pop(type_path, None)
+                continue
+            members[type_path] = tuple(sys.intern(name) for name in bool_names)
+    table.class_members = members
+    table.digest()  # 在 fork worker 之前算好，worker 直接复用
+    return table
+
+def build_and_report(files, seed, jobs=1, chunksize=16):
+    started = time.perf_counter()
+    table = build_symbol_table(files, seed, jobs, chunksize)
+    print(f"📚 符号表：{table.files} 个文件，{len(table.identifiers)} 个标识符，"
+          f"{len(table.class_members)} 个 class（{len(table.ambiguous)} 个重名不参与跨文件查找），"
+          f"指纹表 {table.identifiers.nbytes() // 1024} KB，耗时 {time.perf_counter() - started:.2f}s")
+    return table
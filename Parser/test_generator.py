@@ -2,13 +2,13 @@ from method_generator import generate_method
 
 if __name__ == "__main__":
     # 生成一个有返回值的方法
-    code_with_return = generate_method(has_return=True)
-    print("=== 有返回值方法 ===")
+    code_with_return, name_with_return = generate_method(has_return=True)
+    print(f"=== 有返回值方法 {name_with_return} ===")
     print(code_with_return)
     
     print()
     
     # 生成一个无返回值的方法
-    code_void = generate_method(has_return=False)
-    print("=== 无返回值方法 ===")
+    code_void, name_void = generate_method(has_return=False)
+    print(f"=== 无返回值方法 {name_void} ===")
     print(code_void)
\ No newline at end of file
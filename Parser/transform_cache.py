@@ -0,0 +1,163 @@
+import hashlib
+import os
+import zlib
+
+# =====================
+# 按内容寻址的转换结果缓存
+# =====================
+# key = sha256(输入内容 hash, config.json hash, 模板目录版本, seed)。
+# 每个条目是 <dir>/<key 前两位>/<key>.z，内容为 zlib 压缩后的输出；
+# 旁边的 <key>.names 记录生成该输出时分配的名字（每行一个），命中时用于更新名字清单。
+# 目录里没有索引文件，也不记录绝对路径，整个目录可以直接拷贝到其他机器共用。
+# LRU 依据文件 mtime：命中时刷新 mtime，总大小超过上限时删除最久未用的条目。
+# 大小计数只统计本进程的写入，多个进程共用目录时各自计数会互相看不见：
+# 多进程 worker 以 max_bytes=None 打开（不计数、不淘汰），由主进程在进程池结束后统一 enforce_limit()。
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+class TransformCache:
+    def __init__(self, directory, config_hash, catalogue_version, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._salt = f"{config_hash}:{catalogue_version}"
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        self._size = None  # 第一次写入时才扫描目录
+
+    def key(self, source_bytes, seed=None):
+        source_hash = hashlib.sha256(source_bytes).hexdigest()
+        return hashlib.sha256(f"{source_hash}:{self._salt}:{seed}".encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + ".z")
+
+    def _names_path(self, key):
+        return os.path.join(self.directory, key[:2], key + ".names")
+
+    def get(self, key):
+        """
+        命中时返回解压后的输出 bytes，并刷新条目的 mtime；未命中返回 None。
+        """
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = zlib.decompress(f.read())
+        except (FileNotFoundError, zlib.error):
+            self.misses += 1
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return data
+
+    def get_names(self, key):
+        """
+        返回条目记录的名字列表；条目是旧版本写入、没有名字记录时返回 None。
+        """
+        try:
+            with open(self._names_path(key), "rb") as f:
+                text = f.read().decode("utf-8")
+        except FileNotFoundError:
+            return None
+        return text.split("\n") if text else []
+
+    def put(self, key, output_bytes, names=None):
+        self._write_entry(key, (output_bytes,), names)
+
+    def put_file(self, key, output_path, names=None, chunk_size=1024 * 1024):
+        """
+        从已写好的输出文件分块压缩入库，不把整个输出读进内存。
+        """
+        with open(output_path, "rb") as f:
+            self._write_entry(key, iter(lambda: f.read(chunk_size), b""), names)
+
+    def _replace_atomic(self, path, write):
+        # 先写临时文件再 rename，多个进程同时写同一个 key 也不会读到半个条目
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            write(f)
+            written = f.tell()
+        os.replace(tmp_path, path)
+        return written
+
+    def _write_entry(self, key, chunks, names=None):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        written = 0
+        if names is not None:
+            # 名字先于输出写入：读到 .z 时对应的 .names 一定已经存在
+            written += self._replace_atomic(self._names_path(key), lambda f: f.write("\n".join(names).encode("utf-8")))
+
+        def write(f):
+            compressor = zlib.compressobj()
+            for chunk in chunks:
+                f.write(compressor.compress(chunk))
+            f.write(compressor.flush())
+
+        written += self._replace_atomic(path, write)
+        if self.max_bytes is None:
+            return
+        if self._size is None:
+            self._size = self.disk_usage()
+        else:
+            self._size += written
+        if self._size > self.max_bytes:
+            self.enforce_limit()
+
+    def _iter_entries(self):
+        """
+        产出 (.z 路径, mtime, 条目总大小)，总大小包括对应的 .names 文件。
+        """
+        with os.scandir(self.directory) as buckets:
+            for bucket in buckets:
+                if not bucket.is_dir():
+                    continue
+                records = {}  # key -> [.z 路径, mtime, 大小]
+                with os.scandir(bucket.path) as entries:
+                    for entry in entries:
+                        key, ext = os.path.splitext(entry.name)
+                        if ext not in (".z", ".names"):
+                            continue
+                        try:
+                            stat = entry.stat()
+                        except FileNotFoundError:
+                            continue  # 其他进程刚删掉
+                        record = records.setdefault(key, [None, 0.0, 0])
+                        if ext == ".z":
+                            record[0], record[1] = entry.path, stat.st_mtime
+                        record[2] += stat.st_size
+                for path, mtime, size in records.values():
+                    if path is not None:
+                        yield path, mtime, size
+
+    def disk_usage(self):
+        return sum(size for _, _, size in self._iter_entries())
+
+    def enforce_limit(self):
+        """
+        重新统计目录的实际大小（包括其他进程写入的条目），超过上限时淘汰。
+        """
+        self._size = self.disk_usage()
+        if self.max_bytes is not None and self._size > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        """
+        按 mtime 从旧到新删除条目，直到总大小降到上限的 90% 以下。
+        """
+        entries = sorted(self._iter_entries(), key=lambda e: e[1])
+        total = sum(size for _, _, size in entries)
+        target = self.max_bytes * 0.9
+        for path, _, size in entries:
+            if total <= target:
+                break
+            for entry_path in (path, path[:-len(".z")] + ".names"):
+                try:
+                    os.remove(entry_path)
+                except FileNotFoundError:
+                    pass  # 其他进程已经删掉，或条目没有名字记录
+            total -= size
+        self._size = total
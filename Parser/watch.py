@@ -0,0 +1,270 @@
+import argparse
+import ctypes
+import ctypes.util
+import os
+import random
+import select
+import struct
+import sys
+import time
+
+import modify
+from modify import process_swift_file, transform_source
+from parser_pool import get_parser
+from batch_modify import collect_swift_files, relative_path, remove_outputs
+
+# =====================
+# watch：常驻进程，源文件保存后立即重新处理
+# =====================
+# 解释器、tree-sitter、config.json 和模板目录都只加载一次，
+# 之后每个变化的文件只付出解析和转换本身的时间。
+#
+# Linux 上通过 ctypes 调用 inotify，其余平台或 inotify 不可用时退回定时扫描 mtime。
+# 一次保存常常触发多个事件（编辑器先写临时文件再 rename，或连续保存多个文件），
+# 收到事件后等到 debounce 秒内没有新事件再统一处理，同一个文件只处理一次。
+# 原地处理时写回文件本身也会触发事件：写完后记下 (inode, mtime, size)，之后与之相同的事件直接忽略。
+# 原地处理会改写正在编辑的文件，下次保存时又会在已转换的代码上再转换一遍，
+# 所以默认要求 --output-dir，只有显式指定 --in-place 才原地覆盖。
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENT_HEADER = struct.Struct("iIII")  # struct inotify_event: wd, mask, cookie, len，之后是 len 字节的文件名
+
+def is_source(name):
+    return name.endswith(".swift")
+
+class InotifyWatcher:
+    kind = "inotify"
+
+    def __init__(self, root_dir):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError("当前平台没有 inotify")
+        self._libc = libc
+        self._fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        self.root_dir = root_dir
+        self._dirs = {}  # wd -> 目录路径
+        self.add_tree(root_dir)
+
+    def add_tree(self, directory):
+        """
+        监视 directory 及其全部子目录，返回其中已有的源文件（新建目录时这些文件也要处理）。
+        """
+        found = []
+        for dirpath, dirnames, filenames in os.walk(directory):
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(dirpath), WATCH_MASK)
+            if wd < 0:
+                print(f"⚠️ 无法监视目录 {dirpath}: {os.strerror(ctypes.get_errno())}")
+                continue
+            self._dirs[wd] = dirpath
+            found.extend(os.path.join(dirpath, name) for name in filenames if is_source(name))
+        return found
+
+    def _read_events(self, changed):
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset < len(data):
+            wd, mask, _cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                # 事件队列溢出，丢失了哪些文件未知，整棵树重新处理
+                print("⚠️ inotify 事件队列溢出，重新扫描整个目录")
+                changed.update(collect_swift_files(self.root_dir))
+                continue
+            if mask & IN_IGNORED:
+                self._dirs.pop(wd, None)
+                continue
+            directory = self._dirs.get(wd)
+            if directory is None or not name:
+                continue
+            path = os.path.join(directory, name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    changed.update(self.add_tree(path))
+                continue
+            # 单独的 IN_CREATE 不处理，等写完（IN_CLOSE_WRITE）再说
+            if is_source(name) and mask & (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE):
+                changed.add(path)
+
+    def changes(self, timeout=None):
+        """
+        等待变化，返回变化的源文件路径集合（包括已删除的）；timeout 秒内没有变化时返回空集合。
+        """
+        changed = set()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not changed:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                break
+            readable, _, _ = select.select([self._fd], [], [], remaining)
+            if readable:
+                self._read_events(changed)
+        return changed
+
+    def close(self):
+        os.close(self._fd)
+
+class PollingWatcher:
+    kind = "定时扫描"
+
+    def __init__(self, root_dir, interval=0.5):
+        self.root_dir = root_dir
+        self.interval = interval
+        self._snapshot = self._scan()
+
+    def _scan(self):
+        snapshot = {}
+        for path in collect_swift_files(self.root_dir):
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            snapshot[path] = (st.st_mtime_ns, st.st_size)
+        return snapshot
+
+    def changes(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self.interval if deadline is None else min(self.interval, deadline - time.monotonic())
+            if wait > 0:
+                time.sleep(wait)
+            snapshot = self._scan()
+            changed = {path for path, state in snapshot.items() if self._snapshot.get(path) != state}
+            changed.update(path for path in self._snapshot if path not in snapshot)
+            self._snapshot = snapshot
+            if changed or (deadline is not None and time.monotonic() >= deadline):
+                return changed
+
+    def close(self):
+        pass
+
+def open_watcher(root_dir, poll=False, poll_interval=0.5):
+    if not poll:
+        try:
+            return InotifyWatcher(root_dir)
+        except (OSError, AttributeError) as e:
+            print(f"⚠️ inotify 不可用（{e}），改为每 {poll_interval}s 扫描一次")
+    return PollingWatcher(root_dir, poll_interval)
+
+def file_signature(st):
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+class WatchSession:
+    def __init__(self, root_dir, output_dir=None, seed=None, single_parse=False):
+        self.root_dir = root_dir
+        self.output_dir = output_dir
+        self.seed = seed
+        self.single_parse = single_parse
+        self._own_writes = {}  # path -> 写回后的 file_signature，原地处理时用来忽略自己触发的事件
+
+    def warm_up(self):
+        """
+        先转换一小段代码：构造 parser、编译查询、加载模板，第一次真正保存时不再付出这些时间。
+        """
+        started = time.perf_counter()
+        get_parser()
+        transform_source(b"class Warm {\n    func run(flag: Bool) -> Int {\n        return 1\n    }\n}\n",
+                         single_parse=self.single_parse, rng=random.Random(0))
+        print(f"🔥 预热完成：{(time.perf_counter() - started) * 1000:.0f} ms")
+
+    def handle(self, paths):
+        for path in sorted(paths):
+            relpath = relative_path(path, self.root_dir)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                self._own_writes.pop(path, None)
+                if remove_outputs([relpath], self.output_dir):
+                    print(f"🗑️ {relpath} 已删除，同步删除输出文件")
+                continue
+            if self._own_writes.get(path) == file_signature(st):
+                continue  # 自己写回触发的事件
+
+            started = time.perf_counter()
+            output_path = None
+            if self.output_dir:
+                output_path = os.path.join(self.output_dir, *relpath.split("/"))
+                os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            try:
+                process_swift_file(path, single_parse=self.single_parse, seed=self.seed, relpath=relpath,
+                                   output_path=output_path)
+            except Exception as e:
+                print(f"⚠️ 处理文件 {path} 时出错: {e}")
+                continue
+            if output_path is None:
+                self._own_writes[path] = file_signature(os.stat(path))
+            print(f"✅ {relpath}：{(time.perf_counter() - started) * 1000:.1f} ms")
+
+    def run(self, watcher, debounce=0.2):
+        print(f"👀 正在监视 {self.root_dir}（{watcher.kind}），Ctrl-C 退出")
+        try:
+            while True:
+                pending = watcher.changes()
+                # 连续保存时等到 debounce 秒内没有新的变化再处理
+                while True:
+                    more = watcher.changes(debounce)
+                    if not more:
+                        break
+                    pending |= more
+                self.handle(pending)
+        except KeyboardInterrupt:
+            print("👋 已停止监视")
+        finally:
+            watcher.close()
+
+# =====================
+# 脚本入口
+# =====================
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="监视目录，Swift 文件保存后立即重新处理")
+    arg_parser.add_argument("root_directory", help="要监视的根目录")
+    target_group = arg_parser.add_mutually_exclusive_group(required=True)
+    target_group.add_argument("--output-dir", help="结果写到该目录（保持相对路径），不修改源文件")
+    target_group.add_argument("--in-place", action="store_true",
+                              help="原地覆盖源文件：编辑器里的内容会过期，再次保存会在已转换的代码上重复转换")
+    arg_parser.add_argument("--seed", help="全局随机种子，同一文件内容每次处理的结果相同")
+    arg_parser.add_argument("--single-parse", action="store_true", help="每个文件只解析一次")
+    arg_parser.add_argument("--debounce", type=float, default=0.2,
+                            help="收到变化后等待多少秒没有新变化再处理（默认 0.2）")
+    arg_parser.add_argument("--poll", action="store_true", help="不使用 inotify，定时扫描 mtime")
+    arg_parser.add_argument("--poll-interval", type=float, default=0.5, help="定时扫描的间隔秒数（默认 0.5）")
+    arg_parser.add_argument("--initial", action="store_true", help="开始监视前先处理一遍全部文件")
+    args = arg_parser.parse_args()
+
+    root_directory = args.root_directory
+    if not os.path.isdir(root_directory):
+        print(f"错误：{root_directory} 不是有效目录")
+        sys.exit(1)
+    if args.output_dir:
+        output_real = os.path.realpath(args.output_dir)
+        root_real = os.path.realpath(root_directory)
+        if output_real == root_real or output_real.startswith(root_real + os.sep):
+            print(f"错误：输出目录 {args.output_dir} 不能位于 {root_directory} 内")
+            sys.exit(1)
+
+    modify.VERBOSE = False
+    session = WatchSession(root_directory, args.output_dir, args.seed, args.single_parse)
+    session.warm_up()
+    # 先建立监视再做初始处理，处理期间的修改不会丢失
+    watcher = open_watcher(root_directory, args.poll, args.poll_interval)
+    if args.initial:
+        session.handle(set(collect_swift_files(root_directory)))
+    session.run(watcher, args.debounce)